@@ -39,7 +39,7 @@ setup(
         'dev':
         ['mypy==0.790', 'pylint==2.6.0', 'yapf==0.20.2', 'tox>=3.0.0', 'coverage>=4.5.1,<5', 'pydocstyle>=2.1.1,<3']
     },
-    py_modules=['spurplus', 'spurplus.sftp'],
+    py_modules=['spurplus', 'spurplus.sftp', 'spurplus._connection', 'spurplus._pipeline'],
     include_package_data=True,
     package_data={
         "spurplus": ["py.typed"],
@@ -1,18 +1,23 @@
 #!/usr/bin/env python3
 """Manage remote machines and perform file operations over SSH."""
+import codecs
+import concurrent.futures
 import contextlib
 import enum
 import hashlib
+import io
 import posixpath
 import os
 import pathlib
+import re
 import shutil
 import socket
 import stat as stat_module
+import tarfile
 import time
 import uuid
 from typing import Optional, Union, TextIO, List, Dict, Sequence, Set, Mapping, \
-    Iterator
+    Iterator, Tuple, IO, Callable, Any
 
 import icontract
 import paramiko
@@ -153,6 +158,136 @@ def _path_to_posix_str(path: Union[str, pathlib.Path]) -> str:
     return result
 
 
+def _local_md5(path: pathlib.Path) -> str:
+    """
+    Compute the MD5 checksum of a local file without reading it into memory at once.
+
+    :param path: to the local file
+    :return: MD5 checksum as hexadecimal string
+    """
+    with path.open('rb') as fid:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(fid, 'md5').hexdigest()  # type: ignore
+
+        hsh = hashlib.md5()
+        while True:
+            chunk = fid.read(1024 * 1024)
+            if not chunk:
+                break
+
+            hsh.update(chunk)
+
+        return hsh.hexdigest()
+
+
+# Prefer openssl on the remote machine since it hashes considerably faster than md5sum on the modern CPUs.
+# Both print "<hash> <mark><path>" on each line where the mark is either a space or an asterisk. If the path contains
+# a backslash or a line break, the line is prefixed with a backslash and the path is escaped.
+# Probe openssl on the empty input first since it might be present, but unable to compute MD5 (e.g., in FIPS mode).
+_MD5_SCRIPT = ('if openssl dgst -md5 -r </dev/null >/dev/null 2>&1; then exec openssl dgst -md5 -r "$@"; '
+               'else exec md5sum "$@"; fi')
+
+_MD5_COMMAND_PREFIX = ('sh', '-c', _MD5_SCRIPT, 'sh')
+
+
+def _md5_arguments(remote_paths: Sequence[str]) -> List[str]:
+    """
+    Construct the arguments of the MD5 command referring to the remote files.
+
+    :param remote_paths: to the files
+    :return: argument for each file; the command prints it as the path of the file
+    """
+    # Prefix the paths starting with a dash so that they are not mistaken for options.
+    return ['./' + pth if pth.startswith('-') else pth for pth in remote_paths]
+
+
+def _md5_command(remote_paths: Sequence[str]) -> List[str]:
+    """
+    Construct the command to compute MD5 checksums of the remote files.
+
+    :param remote_paths: to the files
+    :return: command to be run on the remote machine
+    """
+    return list(_MD5_COMMAND_PREFIX) + _md5_arguments(remote_paths=remote_paths)
+
+
+# escape sequences of the paths in the output of the MD5 command
+_MD5_ESCAPE_RE = re.compile(r'\\[\\nr]')
+_MD5_UNESCAPED = {'\\\\': '\\', '\\n': '\n', '\\r': '\r'}
+
+
+def _parse_md5_line(line: str) -> Tuple[str, str]:
+    """
+    Parse a line of the output of the MD5 command.
+
+    :param line: of the output
+    :return: MD5 checksum, path to the file as given in the arguments of the command
+    """
+    if not line.startswith('\\'):
+        return line[:32], line[34:]
+
+    return line[1:33], _MD5_ESCAPE_RE.sub(lambda match: _MD5_UNESCAPED[match.group(0)], line[35:])
+
+
+# return code of the shell if neither openssl nor md5sum is available on the remote machine
+_COMMAND_NOT_FOUND = 127
+
+
+def _md5_over_sftp(sftp: paramiko.SFTP, remote_path: str) -> Optional[str]:
+    """
+    Compute the MD5 checksum of a remote file by reading it over SFTP.
+
+    :param sftp: SFTP client
+    :param remote_path: to the file
+    :return: MD5 checksum as hexadecimal string, or None if the file does not exist
+    """
+    try:
+        fid = sftp.open(remote_path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    with fid:
+        fid.prefetch()
+
+        hsh = hashlib.md5()
+        while True:
+            chunk = fid.read(1024 * 1024)
+            if not chunk:
+                break
+
+            hsh.update(chunk)
+
+        return hsh.hexdigest()
+
+
+def _md5s_over_sftp(sftp: Union[paramiko.SFTP, spurplus.sftp.ReconnectingSFTP],
+                    remote_paths: Sequence[str]) -> List[Optional[str]]:
+    """
+    Compute the MD5 checksums of multiple remote files by reading them over SFTP.
+
+    A paramiko SFTP client is not thread-safe so that the files are read one after another unless the client has
+    a pool of connections. In that case, each file is opened and read on a single pooled connection.
+
+    :param sftp: SFTP client
+    :param remote_paths: to the files
+    :return: MD5 checksum for each file, or None if the file does not exist
+    """
+    if not isinstance(sftp, spurplus.sftp.ReconnectingSFTP):
+        return [_md5_over_sftp(sftp=sftp, remote_path=pth) for pth in remote_paths]
+
+    if sftp.tuning.pool_size <= 1 or len(remote_paths) <= 1:
+        return [sftp.call(_md5_over_sftp, remote_path=pth) for pth in remote_paths]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(sftp.tuning.pool_size, len(remote_paths))) as executor:
+        return list(executor.map(lambda pth: sftp.call(_md5_over_sftp, remote_path=pth), remote_paths))
+
+
+# The bulk sync copies the files as a single tar archive only above this number of files and up to this total size
+# so that large files are not copied to a temporary local archive first.
+_BULK_PUT_MIN_FILES = 8
+_BULK_PUT_MAX_BYTES = 32 * 1024 * 1024
+
+
 class SshShell(icontract.DBC):
     """
     Wrap a spur.SshShell instance.
@@ -220,7 +355,8 @@ class SshShell(icontract.DBC):
             stdout: Optional[TextIO] = None,
             stderr: Optional[TextIO] = None,
             encoding: str = 'utf-8',
-            use_pty: bool = False) -> spur.results.ExecutionResult:
+            use_pty: bool = False,
+            discard_stdout: bool = False) -> spur.results.ExecutionResult:
         """
         Run a command on the remote instance and waits for it to complete.
 
@@ -253,21 +389,31 @@ class SshShell(icontract.DBC):
 
         :param use_pty: (undocumented in spur 0.3.20) If set, requests a pseudo-terminal from the server.
 
+        :param discard_stdout:
+            (spurplus) If set, the standard output of the command is redirected to /dev/null on the remote machine
+            so that it is not transferred over the connection at all.
+
         :return: execution result
         :raise: spur.results.RunProcessError on an error if allow_error=False
 
         """
         # pylint: disable=too-many-arguments
 
-        return self.spawn(
-            command=command,
-            cwd=cwd,
-            update_env=update_env,
-            allow_error=allow_error,
-            stdout=stdout,
-            stderr=stderr,
-            encoding=encoding,
-            use_pty=use_pty).wait_for_result()
+        try:
+            return self.spawn(
+                command=command,
+                cwd=cwd,
+                update_env=update_env,
+                allow_error=allow_error,
+                stdout=stdout,
+                stderr=stderr,
+                encoding=encoding,
+                use_pty=use_pty,
+                discard_stdout=discard_stdout).wait_for_result()
+        finally:
+            if isinstance(self._sftp, spurplus.sftp.ReconnectingSFTP):
+                # The command might have changed the remote file system while it was running.
+                self._sftp.clear_stat_cache()
 
     def check_output(self,
                      command: Sequence[str],
@@ -296,10 +442,14 @@ class SshShell(icontract.DBC):
               stderr: Optional[TextIO] = None,
               encoding: str = 'utf-8',
               use_pty: bool = False,
-              allow_error: bool = False) -> spur.ssh.SshProcess:
+              allow_error: bool = False,
+              discard_stdout: bool = False) -> spur.ssh.SshProcess:
         """
         Spawn a remote process.
 
+        If the stat cache of the SFTP client is enabled (see spurplus.sftp.Tuning), call
+        ``as_sftp().clear_stat_cache()`` once the process finished if it changed the remote file system.
+
         From https://github.com/mwilliamson/spur.py/blob/0.3.20/README.rst:
 
         :param command: to be executed
@@ -333,11 +483,23 @@ class SshShell(icontract.DBC):
 
         :param use_pty: (undocumented in spur 0.3.20) If set, requests a pseudo-terminal from the server.
 
+        :param discard_stdout:
+            (spurplus) If set, the standard output of the command is redirected to /dev/null on the remote machine
+            so that it is not transferred over the connection at all.
+
         :return: spawned process
         :raise: spur.results.RunProcessError on an error if allow_error=False
+        :raise: LookupError if the encoding is unknown
         """
         # pylint: disable=too-many-arguments
 
+        if encoding is not None:
+            # Fail on an unknown encoding before the command is executed on the remote machine.
+            codecs.lookup(encoding)
+
+        if discard_stdout:
+            command = ['sh', '-c', 'exec "$@" > /dev/null', 'sh'] + list(command)
+
         update_env_dict = {} if update_env is None else update_env
 
         if cwd is None:
@@ -349,6 +511,10 @@ class SshShell(icontract.DBC):
         else:
             raise NotImplementedError("Unhandled type of cwd: {}".format(type(cwd)))
 
+        if isinstance(self._sftp, spurplus.sftp.ReconnectingSFTP):
+            # The command might change the remote file system behind the back of the SFTP client.
+            self._sftp.clear_stat_cache()
+
         return self._spur.spawn(
             command=command,
             cwd=resolved_cwd,
@@ -362,15 +528,17 @@ class SshShell(icontract.DBC):
 
     def md5(self, remote_path: Union[str, pathlib.Path]) -> str:
         """
-        Compute MD5 checksum of the remote file. It is assumed that md5sum command is available on the remote machine.
+        Compute MD5 checksum of the remote file.
+
+        It is assumed that either openssl or md5sum command is available on the remote machine.
 
         :param remote_path: to the file
         :return: MD5 sum
         """
         rmt_pth_str = _path_to_posix_str(path=remote_path)
 
-        out = self.run(command=['md5sum', rmt_pth_str]).output
-        remote_hsh, _ = out.strip().split(None, 1)
+        out = self.run(command=_md5_command(remote_paths=[rmt_pth_str])).output
+        remote_hsh, _ = _parse_md5_line(line=out.strip())
 
         return remote_hsh
 
@@ -378,29 +546,47 @@ class SshShell(icontract.DBC):
         """
         Compute MD5 checksums of multiple remote files individually.
 
-        It is assumed that md5sum command is available on the remote machine.
+        The files are hashed on the remote machine with openssl or md5sum. If neither of the commands is available,
+        the files are read over SFTP and hashed locally instead.
 
         :param remote_paths: to the files
         :return: MD5 sum for each remote file separately; if a file does not exist, its checksum is set to None.
         """
+        # pylint: disable=too-many-locals
         rmt_pth_strs = [_path_to_posix_str(remote_path) for remote_path in remote_paths]  # type: List[str]
 
         pth_to_index = dict(((pth, i) for i, pth in enumerate(rmt_pth_strs)))
 
-        existing_pths = [pth for pth in rmt_pth_strs if self.exists(remote_path=pth)]
-
         # chunk in order not to overflow the maximum argument length and count
-        chunks = chunk_arguments(args=existing_pths)
+        chunks = chunk_arguments(args=rmt_pth_strs)
 
         result = [None] * len(rmt_pth_strs)  # type: List[Optional[str]]
 
         for chunk in chunks:
-            lines = self.check_output(command=['md5sum'] + chunk).splitlines()
-            for line in lines:
+            args = _md5_arguments(remote_paths=chunk)
+
+            # The command prints the paths as given in the arguments so that they are mapped back by the arguments.
+            arg_to_index = dict((arg, pth_to_index[pth]) for arg, pth in zip(args, chunk))
+
+            # The missing files are reported on stderr and the rest is hashed so that we need no existence checks.
+            run_result = self.run(command=list(_MD5_COMMAND_PREFIX) + args, allow_error=True)
+
+            # Split only on the line feeds since the other line breaks might be a part of the paths.
+            for line in run_result.output.split('\n'):
                 if len(line) > 0:
-                    remote_hsh, pth = line.strip().split(None, 1)
-                    index = pth_to_index[pth]
-                    result[index] = remote_hsh
+                    remote_hsh, arg = _parse_md5_line(line=line)
+                    result[arg_to_index[arg]] = remote_hsh
+
+            if run_result.return_code == _COMMAND_NOT_FOUND:
+                hshs = _md5s_over_sftp(sftp=self._sftp, remote_paths=chunk)
+                for pth, hsh in zip(chunk, hshs):
+                    result[pth_to_index[pth]] = hsh
+
+            elif run_result.return_code != 0:
+                # Only now check whether the files without a checksum are missing or failed for another reason.
+                unhashed = [pth for pth in chunk if result[pth_to_index[pth]] is None]
+                if any(spurplus.sftp._exists_many(sftp=self._sftp, remote_paths=unhashed)):
+                    raise run_result.to_error()
 
         return result
 
@@ -424,44 +610,65 @@ class SshShell(icontract.DBC):
         :param consistent: if set, copies to a temporary remote file first, and then renames it.
         :return:
         """
+        loc_pth_str = local_path if isinstance(local_path, str) else str(local_path)
+
+        self._put(
+            transfer=lambda rmt_pth_str: self._sftp.put(localpath=loc_pth_str, remotepath=rmt_pth_str),
+            source="the local file {}".format(local_path),
+            remote_path=remote_path,
+            create_directories=create_directories,
+            consistent=consistent)
+
+    def _put(self, transfer: Callable[[str], Any], source: str, remote_path: Union[str, pathlib.Path],
+             create_directories: bool, consistent: bool) -> None:
+        """
+        Transfer the content to the remote path, optionally through a temporary remote file.
+
+        :param transfer: copies the content to the given remote path
+        :param source: description of the content used in the error messages
+        :param remote_path: to the file
+        :param create_directories: if set, creates the parent directory of the remote path with mode 0o777
+        :param consistent: if set, copies to a temporary remote file first, and then renames it.
+        :return:
+        """
         # pylint: disable=too-many-branches
         # pylint: disable=too-many-statements
-        rmt_pth = remote_path if isinstance(remote_path, pathlib.Path) else pathlib.Path(remote_path)
-
-        loc_pth_str = local_path if isinstance(local_path, str) else str(local_path)
+        # pylint: disable=too-many-locals
+        # pylint: disable=too-many-arguments
+        rmt_pth_str = _path_to_posix_str(path=remote_path)
+        rmt_parent_str = posixpath.dirname(rmt_pth_str) or '.'
 
         if create_directories:
-            spurplus.sftp._mkdir(sftp=self._sftp, remote_path=rmt_pth.parent, mode=0o777, parents=True, exist_ok=True)
+            spurplus.sftp._mkdir(sftp=self._sftp, remote_path=rmt_parent_str, mode=0o777, parents=True, exist_ok=True)
 
         oserr = None  # type: Optional[OSError]
 
         if not consistent:
             try:
-                self._sftp.put(localpath=loc_pth_str, remotepath=rmt_pth.as_posix())
+                transfer(rmt_pth_str)
             except OSError as err:
                 oserr = err
 
             if oserr is not None:
-                msg = "Failed to put the local file {} to the remote path {}: {}".format(
-                    local_path, rmt_pth.as_posix(), oserr)
+                msg = "Failed to put {} to the remote path {}: {}".format(source, rmt_pth_str, oserr)
                 if isinstance(oserr, PermissionError):
                     raise PermissionError(msg)
                 else:
                     raise OSError(msg)
 
         else:
-            tmp_pth = rmt_pth.parent / (rmt_pth.name + ".{}.tmp".format(uuid.uuid4()))
+            tmp_name = "{}.{}.tmp".format(posixpath.basename(rmt_pth_str), uuid.uuid4())
+            tmp_pth_str = posixpath.join(rmt_parent_str, tmp_name)
             success = False
 
             try:
                 try:
-                    self._sftp.put(localpath=loc_pth_str, remotepath=tmp_pth.as_posix())
+                    transfer(tmp_pth_str)
                 except OSError as err:
                     oserr = err
 
                 if oserr is not None:
-                    msg = "Failed to put the local file {} to the remote temporary path {}: {}".format(
-                        local_path, tmp_pth, oserr)
+                    msg = "Failed to put {} to the remote temporary path {}: {}".format(source, tmp_pth_str, oserr)
 
                     if isinstance(oserr, PermissionError):
                         raise PermissionError(msg)
@@ -471,20 +678,20 @@ class SshShell(icontract.DBC):
                 # apply the same permissions to the temporary file
                 stat = None  # type: Optional[paramiko.SFTPAttributes]
                 try:
-                    stat = self._sftp.stat(rmt_pth.as_posix())
+                    stat = self._sftp.stat(rmt_pth_str)
                 except FileNotFoundError:
                     pass
 
                 if stat is not None:
                     try:
-                        self._sftp.chmod(path=tmp_pth.as_posix(), mode=stat.st_mode)
-                        self._sftp.chown(path=tmp_pth.as_posix(), uid=stat.st_uid, gid=stat.st_gid)
+                        spurplus.sftp._setstat(
+                            sftp=self._sftp, path=tmp_pth_str, mode=stat.st_mode, uid=stat.st_uid, gid=stat.st_gid)
                     except OSError as err:
                         oserr = err
 
                     if oserr is not None:
                         msg = ("Failed to change the permissions and ownership of "
-                               "the remote temporary path {}: {}").format(tmp_pth, oserr)
+                               "the remote temporary path {}: {}").format(tmp_pth_str, oserr)
                         if isinstance(oserr, PermissionError):
                             raise PermissionError(msg)
                         else:
@@ -492,18 +699,78 @@ class SshShell(icontract.DBC):
 
                 ioerr = None  # type: Optional[IOError]
                 try:
-                    self._sftp.posix_rename(oldpath=tmp_pth.as_posix(), newpath=rmt_pth.as_posix())
+                    self._sftp.posix_rename(oldpath=tmp_pth_str, newpath=rmt_pth_str)
                 except IOError as err:
                     ioerr = err
 
                 if ioerr is not None:
                     raise IOError("Failed to rename the remote temporary file {} to the remote path {}: {}".format(
-                        tmp_pth, remote_path, ioerr))
+                        tmp_pth_str, remote_path, ioerr))
 
                 success = True
             finally:
-                if not success and self.exists(remote_path=tmp_pth):
-                    self._sftp.unlink(path=tmp_pth.as_posix())
+                if not success and self.exists(remote_path=tmp_pth_str):
+                    self._sftp.unlink(path=tmp_pth_str)
+
+    def bulk_put(self,
+                 local_path: Union[str, pathlib.Path],
+                 remote_path: Union[str, pathlib.Path],
+                 relative_paths: Optional[Sequence[Union[str, pathlib.Path]]] = None) -> None:
+        """
+        Put many files beneath the local directory at once by transferring them as a single tar archive.
+
+        The archive is extracted in the remote directory with ``tar`` which is assumed to be available on the remote
+        machine. This spares the round trips of opening and closing each file over SFTP, which dominate the transfer
+        of many small files.
+
+        Mind that the transfer is not consistent: a failed extraction can leave some of the files written.
+        Unlike ``put``, the existing remote files are unlinked and created anew so that their permissions are not kept
+        and the remote symbolic links are replaced instead of followed.
+
+        As with ``put``, the symbolic links are followed and their targets are put, while the remote files belong to
+        the remote user and get the current modification time.
+
+        :param local_path: to the local directory
+        :param remote_path:
+            to the remote directory; it is created if it does not exist. A relative path is resolved against
+            the working directory of the SFTP client.
+        :param relative_paths:
+            paths of the files relative to ``local_path`` to be put; if None, all the files beneath ``local_path``
+        :return:
+        """
+        local_pth = local_path if isinstance(local_path, pathlib.Path) else pathlib.Path(local_path)
+        rmt_pth_str = _path_to_posix_str(path=remote_path)
+
+        if relative_paths is None:
+            rel_pths = sorted(pth.relative_to(local_pth) for pth in local_pth.glob('**/*')
+                              if not pth.is_dir())  # type: Sequence[Union[str, pathlib.Path]]
+        else:
+            rel_pths = relative_paths
+
+        self.mkdir(remote_path=rmt_pth_str, parents=True, exist_ok=True)
+
+        if not rel_pths:
+            return
+
+        # The command runs in the login directory which can differ from the working directory of the SFTP client.
+        rmt_pth_str = self._sftp.normalize(rmt_pth_str)
+
+        with _temporary_file_deleted_after_cm_exit() as tmp:
+            with tarfile.open(str(tmp.path), mode='w', dereference=True) as archive:
+                for rel_pth in rel_pths:
+                    archive.add(
+                        name=str(local_pth / rel_pth), arcname=_path_to_posix_str(path=rel_pth), recursive=False)
+
+            rmt_archive = posixpath.join(rmt_pth_str, ".{}.tar".format(uuid.uuid4()))
+            self.put(local_path=tmp.path, remote_path=rmt_archive, create_directories=False, consistent=False)
+
+            try:
+                # Do not restore the local owners, permissions and modification times even if running as root.
+                self.check_output(command=[
+                    'tar', '-x', '-m', '--no-same-owner', '--no-same-permissions', '-f', rmt_archive, '-C', rmt_pth_str
+                ])
+            finally:
+                self._sftp.remove(rmt_archive)
 
     def write_bytes(self,
                     remote_path: Union[str, pathlib.Path],
@@ -513,8 +780,8 @@ class SshShell(icontract.DBC):
         """
         Write the binary data to a remote file.
 
-        First, the data is written to a temporary local file. Next the local file is transferred to the remote path
-        making sure that the connection is reestablished if needed.
+        The data is written directly from memory without a temporary local file. The write is repeated
+        if the connection needs to be reestablished.
 
         :param remote_path: to the file
         :param data: to be written
@@ -522,18 +789,23 @@ class SshShell(icontract.DBC):
         :param consistent: if set, writes to a temporary remote file first, and then renames it.
         :return:
         """
-        rmt_pth = remote_path if isinstance(remote_path, pathlib.Path) else pathlib.Path(remote_path)
+        rmt_pth_str = _path_to_posix_str(path=remote_path)
 
         if create_directories:
-            spurplus.sftp._mkdir(sftp=self._sftp, remote_path=rmt_pth.parent, mode=0o777, parents=True, exist_ok=True)
-
-        with _temporary_file_deleted_after_cm_exit() as tmp:
-            tmp.path.write_bytes(data)
-            self.put(
-                local_path=str(tmp.path),
-                remote_path=rmt_pth.as_posix(),
-                consistent=consistent,
-                create_directories=create_directories)
+            spurplus.sftp._mkdir(
+                sftp=self._sftp,
+                remote_path=posixpath.dirname(rmt_pth_str) or '.',
+                mode=0o777,
+                parents=True,
+                exist_ok=True)
+
+        # the parent directory has been already created
+        self._put(
+            transfer=lambda pth_str: spurplus.sftp._put_bytes(sftp=self._sftp, data=data, remotepath=pth_str),
+            source="the data",
+            remote_path=rmt_pth_str,
+            create_directories=False,
+            consistent=consistent)
 
     def write_text(self,
                    remote_path: Union[str, pathlib.Path],
@@ -574,22 +846,11 @@ class SshShell(icontract.DBC):
         file_set = set()  # type: Set[pathlib.Path]
         directory_set = set()  # type: Set[pathlib.Path]
 
-        stack = []  # type: List[pathlib.Path]
-        stack.append(remote_path)
-
-        while stack:
-            remote_subpth = stack.pop()
-
-            for attr in self._sftp.listdir_attr(remote_subpth.as_posix()):
-                remote_subsubpth = remote_subpth / attr.filename
-
-                rel_pth = remote_subsubpth.relative_to(remote_path)
-
-                if stat_module.S_ISDIR(attr.st_mode):
-                    stack.append(remote_subsubpth)
-                    directory_set.add(rel_pth)
-                else:
-                    file_set.add(rel_pth)
+        for rel_pth_str, attr in spurplus.sftp._walk(sftp=self._sftp, remote_path=remote_path.as_posix()):
+            if stat_module.S_ISDIR(attr.st_mode):
+                directory_set.add(pathlib.Path(rel_pth_str))
+            else:
+                file_set.add(pathlib.Path(rel_pth_str))
 
         sync_map = _SyncMap()
         sync_map.file_set = file_set
@@ -604,12 +865,14 @@ class SshShell(icontract.DBC):
 
         If one of the directories does not exist, all files are assumed "missing" in that directory.
 
-        The identity of the files is based on MD5 checksums.
+        The identity of the files is based on MD5 checksums. The files whose sizes differ are reported as differing
+        without computing their checksums.
 
         :param local_path: path to the local directory
         :param remote_path: path to the remote directory
         :return: difference between the directories
         """
+        # pylint: disable=too-many-locals
         local_pth = local_path if isinstance(local_path, pathlib.Path) else pathlib.Path(local_path)
 
         remote_pth = remote_path if isinstance(remote_path, pathlib.Path) else pathlib.Path(remote_path)
@@ -648,26 +911,44 @@ class SshShell(icontract.DBC):
         # compare the files
         common_files = sorted(local_map.file_set.intersection(remote_map.file_set))
 
-        local_md5s = []
-        for rel_pth in common_files:
-            local_md5s.append(hashlib.md5((local_pth / rel_pth).read_bytes()).hexdigest())
+        # The files of different sizes differ for sure so that only the files of the same size need to be hashed.
+        # The remote sizes are usually served from the listings cached while walking the remote directory.
+        remote_attrs = spurplus.sftp._stat_batch(
+            sftp=self._sftp, remote_paths=[remote_pth / rel_pth for rel_pth in common_files])
 
-        remote_md5s = self.md5s(remote_paths=[remote_pth / rel_pth for rel_pth in common_files])
+        files_to_hash = []  # type: List[pathlib.Path]
+        for rel_pth, remote_attr in zip(common_files, remote_attrs):
+            if remote_attr is None or remote_attr.st_size is None or \
+                    remote_attr.st_size == (local_pth / rel_pth).stat().st_size:
+                files_to_hash.append(rel_pth)
 
-        for rel_pth, local_md5, remote_md5 in zip(common_files, local_md5s, remote_md5s):
-            if local_md5 != remote_md5:
-                result.differing_files.append(rel_pth)
-            else:
+        # Hash the local files in threads (hashlib releases the GIL) while the remote files are being hashed.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4)) as executor:
+            local_md5_futures = [executor.submit(_local_md5, local_pth / rel_pth) for rel_pth in files_to_hash]
+
+            remote_md5s = self.md5s(remote_paths=[remote_pth / rel_pth for rel_pth in files_to_hash])
+
+            local_md5s = [future.result() for future in local_md5_futures]
+
+        identical_set = set(rel_pth for rel_pth, local_md5, remote_md5 in zip(files_to_hash, local_md5s, remote_md5s)
+                            if local_md5 == remote_md5)
+
+        for rel_pth in common_files:
+            if rel_pth in identical_set:
                 result.identical_files.append(rel_pth)
+            else:
+                result.differing_files.append(rel_pth)
 
         return result
 
+    @icontract.require(lambda consistent, bulk: not (consistent and bulk))
     def sync_to_remote(self,
                        local_path: Union[str, pathlib.Path],
                        remote_path: Union[str, pathlib.Path],
                        consistent: bool = True,
                        delete: Optional[Delete] = None,
-                       preserve_permissions: bool = False) -> None:
+                       preserve_permissions: bool = False,
+                       bulk: bool = False) -> None:
         """
         Sync all the files beneath the ``local_path`` to ``remote_path``.
 
@@ -685,10 +966,14 @@ class SshShell(icontract.DBC):
         :param preserve_permissions:
             if set, the remote files and directories are chmod'ed to reflect the local files and directories,
             respectively.
+        :param bulk:
+            if set, many small files are copied at once with :py:meth:`bulk_put` which requires ``tar`` on the remote
+            machine. Mind the caveats of :py:meth:`bulk_put`; it can not be combined with ``consistent``.
         :return:
         """
         # pylint: disable=too-many-arguments
         # pylint: disable=too-many-branches
+        # pylint: disable=too-many-locals
         local_pth = local_path if isinstance(local_path, pathlib.Path) else pathlib.Path(local_path)
 
         remote_pth = remote_path if isinstance(remote_path, pathlib.Path) else pathlib.Path(remote_path)
@@ -715,17 +1000,46 @@ class SshShell(icontract.DBC):
             for rel_pth in reversed(sorted(dir_diff.remote_only_directories)):
                 self.remove(remote_path=remote_pth / rel_pth, recursive=False)
 
-        # Create directories missing on the remote
-        for rel_pth in dir_diff.local_only_directories:
-            self.mkdir(remote_path=remote_pth / rel_pth)
+        # Create directories missing on the remote in a single round trip. The directories are sorted
+        # so that the parents precede their children.
+        rmt_dir_strs = [(remote_pth / rel_pth).as_posix() for rel_pth in dir_diff.local_only_directories]
+        if rmt_dir_strs:
+            errors = spurplus.sftp._mkdirs(sftp=self._sftp, paths=rmt_dir_strs, mode=0o777)
+            for rmt_dir_str, error in zip(rmt_dir_strs, errors):
+                if error is not None:
+                    raise spurplus.sftp._mkdir_error(directory=rmt_dir_str, err=error) from error
+
+        files_to_put = dir_diff.local_only_files + dir_diff.differing_files
 
-        for rel_pths in [dir_diff.local_only_files, dir_diff.differing_files]:
-            for rel_pth in rel_pths:
-                self.put(
-                    local_path=local_pth / rel_pth,
-                    remote_path=remote_pth / rel_pth,
-                    create_directories=False,
-                    consistent=consistent)
+        if bulk and len(files_to_put) > _BULK_PUT_MIN_FILES and \
+                sum((local_pth / rel_pth).stat().st_size for rel_pth in files_to_put) <= _BULK_PUT_MAX_BYTES:
+            self.bulk_put(local_path=local_pth, remote_path=remote_pth, relative_paths=files_to_put)
+        else:
+            # The files are put concurrently, one per pooled SFTP connection, if the client has a pool.
+            max_workers = 1
+            if isinstance(self._sftp, spurplus.sftp.ReconnectingSFTP):
+                max_workers = max(1, min(self._sftp.tuning.pool_size, len(files_to_put)))
+
+            if max_workers == 1:
+                for rel_pth in files_to_put:
+                    self.put(
+                        local_path=local_pth / rel_pth,
+                        remote_path=remote_pth / rel_pth,
+                        create_directories=False,
+                        consistent=consistent)
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(
+                            self.put,
+                            local_path=local_pth / rel_pth,
+                            remote_path=remote_pth / rel_pth,
+                            create_directories=False,
+                            consistent=consistent) for rel_pth in files_to_put
+                    ]
+
+                for future in futures:
+                    future.result()
 
         if preserve_permissions:
             for rel_pths in [dir_diff.local_only_directories, dir_diff.common_directories]:
@@ -754,7 +1068,7 @@ class SshShell(icontract.DBC):
         Set the permissions of the remote files to be the same as the permissions of the local files.
 
         The files are given as relative paths and are expected to exist both beneath ``local_path`` and
-        beneath ``remote_path``.
+        beneath ``remote_path``. The remote files which already have the local permissions are not chmod'ed.
 
         :param relative_paths: relative paths of files whose permissions are changed
         :param local_path: path to the local directory
@@ -774,11 +1088,19 @@ class SshShell(icontract.DBC):
         if not self.is_dir(remote_path=remote_path):
             raise NotADirectoryError("Remote path is not a directory: {}".format(remote_pth))
 
-        for rel_pth in relative_paths:
-            local_file_pth = local_pth / rel_pth
-            remote_file_pth = remote_pth / rel_pth
+        remote_file_pths = [remote_pth / rel_pth for rel_pth in relative_paths]
+
+        # The remote modes are usually served from the listings cached while computing the directory diff.
+        remote_attrs = spurplus.sftp._stat_batch(sftp=self._sftp, remote_paths=remote_file_pths)
+
+        for rel_pth, remote_file_pth, remote_attr in zip(relative_paths, remote_file_pths, remote_attrs):
+            local_mode = (local_pth / rel_pth).stat().st_mode
 
-            self.chmod(remote_path=remote_file_pth, mode=local_file_pth.stat().st_mode)
+            if remote_attr is not None and remote_attr.st_mode is not None and \
+                    stat_module.S_IMODE(remote_attr.st_mode) == stat_module.S_IMODE(local_mode):
+                continue
+
+            self.chmod(remote_path=remote_file_pth, mode=local_mode)
 
     def get(self,
             remote_path: Union[str, pathlib.Path],
@@ -808,6 +1130,36 @@ class SshShell(icontract.DBC):
         else:
             self._sftp.get(remotepath=rmt_pth_str, localpath=str(loc_pth))
 
+    @icontract.require(lambda mode: mode.replace('b', '').replace('t', '') in ['r', 'w', 'a', 'x'])
+    def open(self, remote_path: Union[str, pathlib.Path], mode: str = 'r', encoding: str = 'utf-8') -> IO:
+        """
+        Open a remote file.
+
+        The reads are prefetched so that the whole file is requested at once instead of chunk by chunk.
+        The writes are pipelined so that the acknowledgements of the server are not awaited after each chunk.
+
+        Mind that the file is not re-opened if the connection breaks.
+
+        :param remote_path: to the file
+        :param mode: one of 'r', 'w', 'a' or 'x', optionally with 'b' for binary or 't' for text mode
+        :param encoding: of the file in text mode
+        :return: opened file; use it as a context manager or close it explicitly
+        """
+        rmt_pth_str = _path_to_posix_str(path=remote_path)
+
+        sftp_mode = mode.replace('b', '').replace('t', '')
+
+        fid = self._sftp.open(rmt_pth_str, sftp_mode + 'b')
+        if sftp_mode == 'r':
+            fid.prefetch()
+        else:
+            fid.set_pipelined(True)
+
+        if 'b' in mode:
+            return fid
+
+        return io.TextIOWrapper(fid, encoding=encoding)
+
     def read_bytes(self, remote_path: Union[str, pathlib.Path]) -> bytes:
         """
         Read the binary data from a remote file.
@@ -875,13 +1227,17 @@ class SshShell(icontract.DBC):
         """
         spurplus.sftp._mkdir(sftp=self._sftp, remote_path=remote_path, mode=mode, parents=parents, exist_ok=exist_ok)
 
-    def remove(self, remote_path: Union[str, pathlib.Path], recursive: bool = False) -> None:
+    def remove(self, remote_path: Union[str, pathlib.Path], recursive: bool = False, use_shell: bool = False) -> None:
         """
         Remove a file or a directory.
 
         :param remote_path: to a file or a directory
         :param recursive:
             if set, removes the directory recursively. This parameter has no effect if remote_path is not a directory.
+        :param use_shell:
+            if set, a directory is removed recursively with a single ``rm -rf`` command on the remote machine instead
+            of removing each file and directory beneath it over SFTP. If the command fails, the removal continues over
+            SFTP so that the error refers to the entry which could not be removed.
         :return:
         """
         rmt_pth_str = _path_to_posix_str(path=remote_path)
@@ -904,12 +1260,38 @@ class SshShell(icontract.DBC):
             self._sftp.rmdir(rmt_pth_str)
             return
 
+        if use_shell and self._remove_tree_with_shell(remote_path=rmt_pth_str):
+            return
+
+        self._remove_tree_over_sftp(remote_path=rmt_pth_str)
+
+    def _remove_tree_with_shell(self, remote_path: str) -> bool:
+        """
+        Remove the directory recursively with a single ``rm -rf`` command on the remote machine.
+
+        :param remote_path: to the directory; a relative path is resolved against the working directory of SFTP
+        :return: True if the directory was removed
+        """
+        # The command runs in the login directory which can differ from the working directory of the SFTP client.
+        absolute_path = self._sftp.normalize(remote_path)
+
+        run_result = self.run(command=['rm', '-rf', '--', absolute_path], allow_error=True)
+
+        return run_result.return_code == 0
+
+    def _remove_tree_over_sftp(self, remote_path: str) -> None:
+        """
+        Remove the directory recursively by removing each file and directory beneath it over SFTP.
+
+        :param remote_path: to the directory
+        :return:
+        """
         # Remove all files in the first step, then remove all the directories in a second step
         stack1 = []  # type: List[str]
         stack2 = []  # type: List[str]
 
         # First step: remove all files
-        stack1.append(rmt_pth_str)
+        stack1.append(remote_path)
 
         while stack1:
             pth = stack1.pop()
@@ -925,7 +1307,7 @@ class SshShell(icontract.DBC):
                         self._sftp.remove(path=subpth)
                     except OSError as err:
                         raise OSError("Failed to remove the remote file while recursively removing {}: {}".format(
-                            rmt_pth_str, subpth)) from err
+                            remote_path, subpth)) from err
 
         # Second step: remove all directories
         while stack2:
@@ -935,7 +1317,7 @@ class SshShell(icontract.DBC):
                 self._sftp.rmdir(path=pth)
             except OSError as err:
                 raise OSError("Failed to remove the remote directory while recursively removing {}: {}".format(
-                    rmt_pth_str, pth)) from err
+                    remote_path, pth)) from err
 
     def chmod(self, remote_path: Union[str, pathlib.Path], mode: int) -> None:
         """
@@ -1089,10 +1471,6 @@ class TemporaryDirectory(metaclass=icontract.DBCMeta):  # type: ignore
             cmd.append('--suffix={}'.format(suffix))
 
         if tmpdir is not None:
-            if not shell.exists(remote_path=tmpdir):
-                raise FileNotFoundError(
-                    "Remote parent directory of the temporary directory does not exist: {}".format(tmpdir))
-
             tmpdir_str = tmpdir if isinstance(tmpdir, str) else tmpdir.as_posix()
             cmd.append('--tmpdir={}'.format(tmpdir_str))
 
@@ -1103,7 +1481,17 @@ class TemporaryDirectory(metaclass=icontract.DBCMeta):  # type: ignore
 
             cmd.append(''.join(template))
 
-        self.path = pathlib.Path(shell.check_output(command=cmd).strip())
+        run_result = shell.run(command=cmd, allow_error=True)
+
+        if run_result.return_code != 0:
+            # Check the parent directory only on failure so that the usual case costs a single round trip.
+            if tmpdir is not None and not shell.exists(remote_path=tmpdir):
+                raise FileNotFoundError(
+                    "Remote parent directory of the temporary directory does not exist: {}".format(tmpdir))
+
+            raise run_result.to_error()
+
+        self.path = pathlib.Path(run_result.output.strip())
 
     def __enter__(self) -> 'TemporaryDirectory':
         """Enter the context already prepared in the constructor."""
@@ -1127,7 +1515,12 @@ def connect_with_retries(hostname: str,
                          load_system_host_keys: Optional[bool] = True,
                          sock: Optional[socket.socket] = None,
                          retries: int = 12,
-                         retry_period: int = 5) -> SshShell:
+                         retry_period: int = 5,
+                         window_size: Optional[int] = 4 * 1024 * 1024,
+                         max_packet_size: Optional[int] = None,
+                         socket_buffer_size: Optional[int] = None,
+                         sftp_pool_size: int = 1,
+                         retry_on_unresolved_host: bool = True) -> SshShell:
     """
     Try to connect to the instance and retry on failure.
 
@@ -1177,6 +1570,21 @@ def connect_with_retries(hostname: str,
 
     :param retries: (spurplus) number of re-tries if the connection could not be established
     :param retry_period: (spurplus) how many seconds to wait between the retries
+    :param window_size:
+        (spurplus) size of the SSH window of the channels in bytes. A larger window keeps more data in flight on
+        the links with a high round-trip time. If None, the paramiko default is used.
+    :param max_packet_size:
+        (spurplus) maximum size of an SSH packet of the channels in bytes; if None, the paramiko default is used
+    :param socket_buffer_size:
+        (spurplus) size of the send and receive buffers of the TCP socket in bytes. If None, the operating system
+        tunes the buffers automatically, which is usually preferable.
+    :param sftp_pool_size:
+        (spurplus) maximum number of SFTP channels used at the same time when the shell is used from multiple
+        threads. The further channels are opened on demand on the same SSH connection.
+        :py:meth:`SshShell.sync_to_remote` puts the files concurrently over as many channels.
+    :param retry_on_unresolved_host:
+        (spurplus) if set, the connection is retried also if the host name could not be resolved. Unset it to fail
+        immediately when the host name is not expected to become resolvable during the retries.
 
     :return: established SshShell
     """
@@ -1194,6 +1602,7 @@ def connect_with_retries(hostname: str,
 
     last_err = None  # type: Union[None, Exception]
     bad_host_key_err = None  # type: Optional[ConnectionError]
+    unresolved_host_err = None  # type: Optional[ConnectionError]
 
     while True:
         try:
@@ -1211,11 +1620,21 @@ def connect_with_retries(hostname: str,
                 sock=sock)
             spur_ssh_shell.run(command=['sh', '-c', 'echo hello > /dev/null'])
 
+            # The channels opened from now on, including the SFTP ones, use the given window and packet size.
+            spurplus._connection.tune_transport(
+                transport=spur_ssh_shell._get_ssh_transport(),
+                window_size=window_size,
+                max_packet_size=max_packet_size,
+                socket_buffer_size=socket_buffer_size)
+
             # "ssh_retries_left" differ from ReconnectingSFTP retries and will not be returned to the SShShell.
             # "ssh_retries_left" is a value for how many times the ssh connection will be reestablished while
             # "max_retries" of ReconnectingSFTP stands for how many time the function in the wrapper will be retried
             # before raising a ConnectionError. Therefore never set "max_retries" equal "ssh_retries_left".
-            sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=spur_ssh_shell._open_sftp_client)
+            tuning = spurplus.sftp.Tuning()
+            tuning.pool_size = sftp_pool_size
+
+            sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=spur_ssh_shell._open_sftp_client, tuning=tuning)
 
             shell = SshShell(spur_ssh_shell=spur_ssh_shell, sftp=sftp)
 
@@ -1231,6 +1650,12 @@ def connect_with_retries(hostname: str,
 
                 break
 
+            if not retry_on_unresolved_host and isinstance(err.original_error, socket.gaierror):
+                unresolved_host_err = ConnectionError("Failed to resolve the host name {}: {}".format(
+                    hostname, err.original_error))
+
+                break
+
             last_err = err
             ssh_retries_left -= 1
             if ssh_retries_left > 0:
@@ -1240,6 +1665,8 @@ def connect_with_retries(hostname: str,
 
     if bad_host_key_err is not None:
         raise bad_host_key_err  # pylint: disable=raising-bad-type
+    elif unresolved_host_err is not None:
+        raise unresolved_host_err  # pylint: disable=raising-bad-type
     else:
         raise ConnectionError("Failed to connect after {} retries to {}: {}".format(retries, hostname, last_err))
 
@@ -1257,9 +1684,18 @@ def chunk_arguments(args: Sequence[str], arg_max: int = 16 * 1024, argc_max=1024
     :param argc_max: maximum number of command-line arguments
     :return: chunked command-line arguments
     """
+    chunks = []  # type: List[List[str]]
+    chunk_size = 0
+
+    # latest chunk
+    chunk = []  # type: List[str]
+
+    # Validate and chunk the arguments in a single pass so that each length is computed only once.
     for i, arg in enumerate(args):
-        if len(arg) > arg_max:
-            if len(arg) > 50:
+        arg_len = len(arg)
+
+        if arg_len > arg_max:
+            if arg_len > 50:
                 arg_str = arg[:50] + " [...]"
             else:
                 arg_str = arg
@@ -1267,22 +1703,17 @@ def chunk_arguments(args: Sequence[str], arg_max: int = 16 * 1024, argc_max=1024
             raise ValueError("The command-line argument {} is longer than allowed maximum length {}: {}".format(
                 i, arg_max, arg_str))
 
-    chunks = []  # type: List[List[str]]
-    chunk_size = 0
-
-    # latest chunk
-    chunk = []  # type: List[str]
-    for arg in args:
-        if len(arg) + chunk_size > arg_max or chunk_size > argc_max:
+        if arg_len + chunk_size > arg_max or chunk_size > argc_max:
             chunks.append(chunk)
             chunk = []
             chunk_size = 0
 
-        chunk.append(arg)
-        chunk_size += len(arg)
-        if len(chunk) > 1:
+        if chunk:
             chunk_size += 1  # + 1 for white-space
 
+        chunk.append(arg)
+        chunk_size += arg_len
+
     if len(chunk) > 0:
         chunks.append(chunk)
 
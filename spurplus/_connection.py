@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Share and tune the SSH connections underlying the SFTP clients."""
+import hashlib
+import hmac
+import os
+import socket
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple  # pylint: disable=unused-import
+
+import paramiko
+
+# identifies the SSH connections which can be shared, i.e. which were established to the same server with the same
+# credentials, host key policy and compression. The password is only kept as a digest since the keys live in
+# the registry of the shared clients as long as the process.
+ConnectionKey = NamedTuple(
+    'ConnectionKey', [('hostname', str), ('port', int), ('username', Optional[str]), ('password_digest', Optional[str]),
+                      ('private_key_file', Optional[str]), ('look_for_private_keys', Optional[bool]),
+                      ('load_system_host_keys', Optional[bool]), ('missing_host_key', Any), ('compress', bool)])
+
+# random salt of the password digests so that the digests found in the memory can not be looked up in a table
+_PASSWORD_SALT = os.urandom(32)
+
+
+def digest_password(password: Optional[str]) -> Optional[str]:
+    """
+    Compute the salted digest of the password to be used in a connection key.
+
+    :param password: for the authentication; None if the password authentication is not used
+    :return: hexadecimal digest, or None if there is no password
+    """
+    if password is None:
+        return None
+
+    return hmac.new(_PASSWORD_SALT, password.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class SharedClient:
+    """Count the SFTP channels opened on an SSH client and close the client once the last channel is closed."""
+
+    # connection key -> shared client
+    _registry = dict()  # type: Dict[ConnectionKey, SharedClient]
+    _lock = threading.Lock()
+
+    def __init__(self, client: paramiko.SSHClient) -> None:
+        """
+        Initialize with a single user of the client.
+
+        :param client: connected SSH client
+        """
+        self.client = client
+        self.users = 1
+        self.key = None  # type: Optional[ConnectionKey]
+
+    @classmethod
+    def acquire(cls, key: ConnectionKey) -> Optional['SharedClient']:
+        """
+        Find the shared client with a live connection and increase its count of users.
+
+        :param key: identifies the connection
+        :return: shared client, or None if there is no live connection
+        """
+        with cls._lock:
+            shared = cls._registry.get(key, None)
+            if shared is None:
+                return None
+
+            transport = shared.client.get_transport()
+            if transport is None or not transport.is_active():
+                del cls._registry[key]
+                shared.key = None
+                return None
+
+            shared.users += 1
+            return shared
+
+    def register(self, key: ConnectionKey) -> None:
+        """
+        Make the client available to the other users unless there is already a client for the key.
+
+        :param key: identifies the connection
+        :return:
+        """
+        with SharedClient._lock:
+            if key not in SharedClient._registry:
+                SharedClient._registry[key] = self
+                self.key = key
+
+    def release(self) -> None:
+        """Decrease the count of users and close the client if nobody uses it anymore."""
+        with SharedClient._lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+
+            if self.key is not None and SharedClient._registry.get(self.key, None) is self:
+                del SharedClient._registry[self.key]
+                self.key = None
+
+        self.client.close()
+
+
+# path to the known hosts file -> (modification time, parsed host keys)
+_HOST_KEYS_CACHE = dict()  # type: Dict[str, Tuple[float, paramiko.HostKeys]]
+_HOST_KEYS_LOCK = threading.Lock()
+
+
+def load_system_host_keys(client: paramiko.SSHClient) -> None:
+    """
+    Load the system host keys into the client, but parse the known hosts file only if it changed in the meantime.
+
+    :param client: SSH client whose system host keys are set
+    :return:
+    """
+    path = os.path.expanduser("~/.ssh/known_hosts")
+
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        # Let paramiko look for the alternative locations and ignore the missing file on its own.
+        client.load_system_host_keys()
+        return
+
+    with _HOST_KEYS_LOCK:
+        cached = _HOST_KEYS_CACHE.get(path, None)
+        if cached is not None and cached[0] == mtime:
+            host_keys = cached[1]
+        else:
+            host_keys = paramiko.HostKeys()
+            host_keys.load(path)
+            _HOST_KEYS_CACHE[path] = (mtime, host_keys)
+
+    # The system host keys are only read by the client so that the instance can be shared.
+    client._system_host_keys = host_keys  # pylint: disable=protected-access
+
+
+def tune_transport(transport: paramiko.Transport,
+                   window_size: Optional[int] = None,
+                   max_packet_size: Optional[int] = None,
+                   socket_buffer_size: Optional[int] = None) -> None:
+    """
+    Set the defaults of the channels opened on the SSH transport from now on and the options of its socket.
+
+    Nagle's algorithm is disabled on a TCP socket since the small SFTP requests would otherwise be delayed until
+    the previous ones are acknowledged.
+
+    :param transport: SSH transport
+    :param window_size: SSH window size of the channels in bytes; if None, left unchanged
+    :param max_packet_size: maximum SSH packet size of the channels in bytes; if None, left unchanged
+    :param socket_buffer_size:
+        size of the send and receive buffers of the underlying TCP socket in bytes; if None, left to the operating
+        system which tunes them automatically
+    :return:
+    """
+    if window_size is not None:
+        transport.default_window_size = window_size
+
+    if max_packet_size is not None:
+        transport.default_max_packet_size = max_packet_size
+
+    if not isinstance(transport.sock, socket.socket):
+        return
+
+    if transport.sock.family in (socket.AF_INET, socket.AF_INET6):
+        transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    if socket_buffer_size is not None:
+        transport.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, socket_buffer_size)
+        transport.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, socket_buffer_size)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Pipeline the SFTP requests and transfers over a single paramiko.SFTP client."""
+import inspect
+import io
+import posixpath
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union  # pylint: disable=unused-import
+
+import paramiko
+import paramiko.sftp
+
+# paramiko < 3.3 does not support limiting the number of concurrent read requests.
+_GET_SUPPORTS_MAX_REQUESTS = 'max_concurrent_prefetch_requests' in inspect.signature(paramiko.SFTPClient.get).parameters
+
+
+def put_bytes(sftp: paramiko.SFTP, data: bytes, remotepath: str, confirm: bool = True) -> paramiko.SFTPAttributes:
+    """
+    Write the data to the remote path without waiting for the acknowledgement of each written chunk.
+
+    :param sftp: SFTP client
+    :param data: to be written
+    :param remotepath: to the remote file
+    :param confirm: if set, checks the size of the remote file after the transfer
+    :return: attributes of the remote file if ``confirm`` is set, empty attributes otherwise
+    """
+    # A new buffer is needed on each call since the call is repeated if the connection needs to be reestablished.
+    return sftp.putfo(io.BytesIO(data), remotepath, file_size=len(data), confirm=confirm)
+
+
+def get(sftp: paramiko.SFTP,
+        remotepath: str,
+        localpath: str,
+        callback: Optional[Callable[[int, int], None]] = None,
+        max_requests: int = 128) -> None:
+    """
+    Copy the remote file to the local path while keeping at most the given number of read requests in flight.
+
+    :param sftp: SFTP client
+    :param remotepath: to the remote file
+    :param localpath: to the local file
+    :param callback: called with the bytes transferred so far and the total bytes to be transferred
+    :param max_requests: maximum number of read requests in flight
+    :return:
+    """
+    if _GET_SUPPORTS_MAX_REQUESTS:
+        sftp.get(remotepath, localpath, callback=callback, max_concurrent_prefetch_requests=max_requests)
+    else:
+        sftp.get(remotepath, localpath, callback=callback)
+
+
+class _ResponseCollector:
+    """Collect the responses to pipelined SFTP requests which paramiko would otherwise discard."""
+
+    def __init__(self) -> None:
+        """Initialize with no responses."""
+        self.responses = dict()  # type: Dict[int, Tuple[int, paramiko.Message]]
+
+    def _async_response(self, t: int, msg: paramiko.Message, num: int) -> None:
+        """Record the response; called by paramiko.SFTP on a response to a request that nobody waits for."""
+        # pylint: disable=invalid-name
+        self.responses[num] = (t, msg)
+
+
+def _supports_pipelining(sftp: paramiko.SFTP) -> bool:
+    """
+    Check whether the SFTP client is a paramiko client whose requests can be pipelined.
+
+    :param sftp: SFTP client
+    :return: True if the requests can be sent with ``_exchange``
+    """
+    return hasattr(sftp, '_async_request') and hasattr(sftp, '_read_response')
+
+
+def _absolute(sftp: paramiko.SFTP, path: str) -> str:
+    """
+    Resolve the path against the working directory of the SFTP client as paramiko does before sending a request.
+
+    :param sftp: SFTP client
+    :param path: to the remote file
+    :return: path as sent to the server
+    """
+    cwd = sftp.getcwd()
+    return path if cwd is None else posixpath.join(cwd, path)
+
+
+def _exchange(sftp: paramiko.SFTP, command: int,
+              requests: Sequence[Sequence[Any]]) -> List[Union[None, paramiko.SFTPAttributes, OSError]]:
+    """
+    Send all the requests at once and collect the responses afterwards.
+
+    :param sftp: SFTP client
+    :param command: SFTP command of the requests
+    :param requests: arguments of each request; the paths need to be resolved with ``_absolute``
+    :return:
+        for each request, the attributes if the server responded with them, None if it responded with a success,
+        or the error corresponding to the error status
+    """
+    # pylint: disable=protected-access
+    # paramiko exposes no public API to send a request without waiting for its response.
+    collector = _ResponseCollector()
+    nums = [sftp._async_request(collector, command, *args) for args in requests]
+
+    while len(collector.responses) < len(nums):
+        sftp._read_response()
+
+    result = []  # type: List[Union[None, paramiko.SFTPAttributes, OSError]]
+    for num in nums:
+        t, msg = collector.responses[num]  # pylint: disable=invalid-name
+        if t == paramiko.sftp.CMD_ATTRS:
+            result.append(paramiko.SFTPAttributes._from_msg(msg))
+            continue
+
+        if t != paramiko.sftp.CMD_STATUS:
+            raise paramiko.SFTPError("Expected an attributes or a status response, but got: {}".format(t))
+
+        try:
+            sftp._convert_status(msg)
+            result.append(None)
+        except OSError as err:
+            result.append(err)
+
+    return result
+
+
+def _expect_statuses(results: Sequence[Union[None, paramiko.SFTPAttributes, OSError]],
+                     request: str) -> List[Optional[OSError]]:
+    """
+    Check that the server responded to the pipelined requests only with a status.
+
+    :param results: of ``_exchange``
+    :param request: description of the requests used in the error message
+    :return: error for each request, or None on success
+    :raise: paramiko.SFTPError if the server responded with attributes
+    """
+    errors = []  # type: List[Optional[OSError]]
+    for result in results:
+        if isinstance(result, paramiko.SFTPAttributes):
+            raise paramiko.SFTPError("Expected a status response to {}, but got attributes.".format(request))
+
+        errors.append(result)
+
+    return errors
+
+
+def mkdirs(sftp: paramiko.SFTP, paths: Sequence[str], mode: int = 0o777) -> List[Optional[OSError]]:
+    """
+    Send all the mkdir requests at once and collect the responses afterwards.
+
+    If the SFTP client does not support pipelining, the directories are created one after another.
+
+    :param sftp: SFTP client
+    :param paths: to the directories; parents need to precede their children
+    :param mode: directory permission mode
+    :return: error for each directory, or None if the directory was created
+    """
+    if not _supports_pipelining(sftp=sftp):
+        errors = []  # type: List[Optional[OSError]]
+        for path in paths:
+            try:
+                sftp.mkdir(path, mode)
+                errors.append(None)
+            except OSError as err:
+                errors.append(err)
+
+        return errors
+
+    attr = paramiko.SFTPAttributes()
+    attr.st_mode = mode
+
+    results = _exchange(
+        sftp=sftp,
+        command=paramiko.sftp.CMD_MKDIR,
+        requests=[(_absolute(sftp=sftp, path=path), attr) for path in paths])
+
+    return _expect_statuses(results=results, request="mkdir")
+
+
+def posix_renames(sftp: paramiko.SFTP, pairs: Sequence[Tuple[str, str]]) -> List[Optional[OSError]]:
+    """
+    Send all the POSIX rename requests at once and collect the responses afterwards.
+
+    If the SFTP client does not support pipelining, the files are renamed one after another.
+
+    :param sftp: SFTP client
+    :param pairs: old path and new path for each file
+    :return: error for each rename, or None if the file was renamed
+    """
+    if not _supports_pipelining(sftp=sftp):
+        errors = []  # type: List[Optional[OSError]]
+        for oldpath, newpath in pairs:
+            try:
+                sftp.posix_rename(oldpath, newpath)
+                errors.append(None)
+            except OSError as err:
+                errors.append(err)
+
+        return errors
+
+    results = _exchange(
+        sftp=sftp,
+        command=paramiko.sftp.CMD_EXTENDED,
+        requests=[("posix-rename@openssh.com", _absolute(sftp=sftp, path=oldpath), _absolute(sftp=sftp, path=newpath))
+                  for oldpath, newpath in pairs])
+
+    return _expect_statuses(results=results, request="posix-rename")
+
+
+def stats(sftp: paramiko.SFTP, paths: Sequence[str]) -> List[Optional[paramiko.SFTPAttributes]]:
+    """
+    Send all the stat requests at once and collect the responses afterwards.
+
+    If the SFTP client does not support pipelining, the paths are stat'ed one after another.
+
+    :param sftp: SFTP client
+    :param paths: to the files
+    :return: attributes for each path, or None if the file does not exist
+    :raise: OSError of the first path which could not be stat'ed for a reason other than its absence
+    """
+    result = []  # type: List[Optional[paramiko.SFTPAttributes]]
+
+    if not _supports_pipelining(sftp=sftp):
+        for path in paths:
+            try:
+                result.append(sftp.stat(path))
+            except FileNotFoundError:
+                result.append(None)
+
+        return result
+
+    responses = _exchange(
+        sftp=sftp, command=paramiko.sftp.CMD_STAT, requests=[(_absolute(sftp=sftp, path=path), ) for path in paths])
+
+    for response in responses:
+        if isinstance(response, FileNotFoundError):
+            result.append(None)
+        elif isinstance(response, OSError):
+            raise response
+        elif response is None:
+            raise paramiko.SFTPError("Expected an error status in response to stat, but got a success.")
+        else:
+            result.append(response)
+
+    return result
+
+
+def setstat(sftp: paramiko.SFTP, path: str, mode: int, uid: int, gid: int) -> None:
+    """
+    Change the permissions and the ownership of the remote file with a single request.
+
+    If the SFTP client does not support pipelining, chmod and chown are sent one after another.
+
+    :param sftp: SFTP client
+    :param path: to the remote file
+    :param mode: permission mode
+    :param uid: user ID of the owner
+    :param gid: group ID of the owner
+    :return:
+    """
+    if not _supports_pipelining(sftp=sftp):
+        sftp.chmod(path, mode)
+        sftp.chown(path, uid, gid)
+        return
+
+    attr = paramiko.SFTPAttributes()
+    attr.st_mode = mode
+    attr.st_uid = uid
+    attr.st_gid = gid
+
+    results = _exchange(
+        sftp=sftp, command=paramiko.sftp.CMD_SETSTAT, requests=[(_absolute(sftp=sftp, path=path), attr)])
+
+    err = _expect_statuses(results=results, request="setstat")[0]
+    if err is not None:
+        raise err
@@ -1,46 +1,181 @@
 #!/usr/bin/env python3
 """Wrap paramiko.SFTP."""
+import collections
+import concurrent.futures
+import errno
 import os
 import pathlib
+import posixpath
+import queue
+import random
 import socket
+import stat as stat_module
+import threading
 import time
-from typing import TypeVar, Callable, Optional, Union  # pylint: disable=unused-import
+from typing import TypeVar, Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, \
+    Union  # pylint: disable=unused-import
 
 import icontract
 import paramiko
 import spur
 
+from spurplus import _connection, _pipeline
+
+# pylint: disable=too-many-lines
+
 T = TypeVar('T')  # pylint: disable=invalid-name
 
+# marks a remote path in the cache that does not exist
+_MISSING = object()
+
+# methods of paramiko.SFTP which do not modify the remote file system
+_READ_ONLY_METHODS = frozenset(['readlink', 'normalize', 'getcwd', 'listdir_iter', 'get_channel', 'getfo'])
+
+
+class _Channel:
+    """Hold an SFTP client together with its state which needs to be reset on reconnect."""
+
+    __slots__ = ('sftp', 'opener', 'method_cache', 'cwd', 'reconnect_lock')
+
+    def __init__(self, opener: Optional[Callable[[], paramiko.SFTP]] = None) -> None:
+        """
+        Initialize without an SFTP client.
+
+        :param opener: method to open a new SFTP client; if None, the opener of the reconnecting SFTP is used
+        """
+        self.sftp = None  # type: Optional[paramiko.SFTP]
+        self.opener = opener
+
+        # serializes re-opening of self.sftp among the callers sharing this connection
+        self.reconnect_lock = threading.Lock()
+
+        # method name -> method bound to self.sftp
+        self.method_cache = dict()  # type: Dict[str, Callable]
+
+        # working directory of self.sftp
+        self.cwd = None  # type: Optional[str]
+
+    def reset(self) -> None:
+        """Close the SFTP client and forget its state."""
+        if self.sftp is not None:
+            self.sftp.close()
+            self.sftp = None
+
+        self.method_cache.clear()
+        self.cwd = None
+
+
+class Tuning:
+    """
+    Group the settings of ReconnectingSFTP which trade off its performance.
+
+    :ivar max_backoff: maximum wait between two retries; in seconds
+    :vartype max_backoff: float
+
+    :ivar timeout:
+        maximum total time spent on a method including the retries; in seconds. If None, only the maximum number
+        of retries bounds the retries.
+    :vartype timeout: Optional[float]
+
+    :ivar stat_ttl:
+        how long the results of ``stat``, ``lstat`` and ``listdir_attr`` are cached; in seconds.
+        The cache is disabled with the default of 0. Enable it only if no other client, including the commands
+        run on the remote machine, changes the remote files in the meantime since the cached results are not
+        checked against the server.
+    :vartype stat_ttl: float
+
+    :ivar max_requests: maximum number of read requests in flight during ``get``
+    :vartype max_requests: int
+
+    :ivar pool_size:
+        maximum number of SFTP connections used at the same time by the concurrent callers.
+        With the default of 1, the client is not thread-safe. Mind that the servers limit the number of
+        sessions per SSH connection (OpenSSH defaults to 10 with MaxSessions).
+    :vartype pool_size: int
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize with the defaults."""
+        self.max_backoff = 5.0
+        self.timeout = None  # type: Optional[float]
+        self.stat_ttl = 0.0
+        self.max_requests = 128
+        self.pool_size = 1
+
 
 class ReconnectingSFTP:
     """Open automatically a new paramiko.SFTP on connection failure."""
 
     # pylint: disable=too-many-public-methods
+    # pylint: disable=too-many-instance-attributes
+
+    __slots__ = ('__sftp_opener', 'max_retries', 'retry_period', 'tuning', '_primary', '_primary_lock', '_idle',
+                 '_pool_lock', '_opened', 'last_working_directory', '_login_directory', '_stat_cache', '_listdir_cache',
+                 '_proxies')
 
-    def __init__(self, sftp_opener: Callable[[], paramiko.SFTP], max_retries: int = 10,
-                 retry_period: float = 0.1) -> None:
+    def __init__(self,
+                 sftp_opener: Callable[[], paramiko.SFTP],
+                 max_retries: int = 10,
+                 retry_period: float = 0.1,
+                 tuning: Optional[Tuning] = None) -> None:
         """
         Iniialize.
 
         :param sftp_opener: method to open a new SFTP connection
         :param max_retries: maximum number of retries before raising ConnectionError
-        :param retry_period: how long to wait between two retries; in seconds
+        :param retry_period:
+            how long to wait before the first retry; in seconds. The wait doubles with each further retry
+            and a random jitter of up to ``retry_period`` is added.
+        :param tuning: further settings; if None, the defaults are used
         """
         self.__sftp_opener = sftp_opener
         self.max_retries = max_retries
         self.retry_period = retry_period
+        self.tuning = tuning if tuning is not None else Tuning()
 
-        self._sftp = None  # type: Optional[paramiko.SFTP]
+        # connection used by a single caller at a time
+        self._primary = _Channel()
+        self._primary_lock = threading.Lock()
+
+        # further connections for the concurrent callers when the primary one is busy
+        self._idle = queue.LifoQueue()  # type: queue.LifoQueue
+        self._pool_lock = threading.Lock()
+        self._opened = 0
 
         # last recorded working directory
         self.last_working_directory = None  # type: Optional[str]
 
+        # initial working directory of the SFTP connections, fetched on demand
+        self._login_directory = None  # type: Optional[str]
+
+        # normalized remote path -> (time of the stat, attributes or _MISSING if the path does not exist)
+        self._stat_cache = dict()  # type: Dict[str, Tuple[float, Any]]
+
+        # normalized remote path of a directory -> (time of the listing, entry name -> attributes)
+        self._listdir_cache = dict()  # type: Dict[str, Tuple[float, Dict[str, paramiko.SFTPAttributes]]]
+
+        # method name -> proxy generated by __getattr__
+        self._proxies = dict()  # type: Dict[str, Callable[..., Any]]
+
+    @property
+    def _sftp(self) -> Optional[paramiko.SFTP]:
+        """Get the paramiko SFTP client of the primary connection, if it is open."""
+        return self._primary.sftp
+
     def close(self) -> None:
-        """Close the the underlying paramiko SFTP client."""
-        if self._sftp is not None:
-            self._sftp.close()
-            self._sftp = None
+        """Close the the underlying paramiko SFTP clients."""
+        self._primary.reset()
+
+        with self._pool_lock:
+            while True:
+                try:
+                    channel = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+
+                channel.reset()
+                self._opened -= 1
 
     def __enter__(self) -> 'ReconnectingSFTP':
         """Return self prepared in a constructor upon enter."""
@@ -50,104 +185,756 @@ class ReconnectingSFTP:
         """Close upon exist."""
         self.close()
 
-    def __wrap(self, method: Callable[[paramiko.SFTP], T]) -> T:
+    @staticmethod
+    def _is_alive(sftp: paramiko.SFTP) -> bool:
+        """
+        Check locally, without a round trip, whether the connection of the SFTP client is still usable.
+
+        :param sftp: SFTP client
+        :return: True if the channel is open and the underlying transport is active
+        """
+        channel = sftp.sock
+        if channel is None or channel.closed:
+            return False
+
+        transport = channel.get_transport()
+        return transport is not None and transport.is_active()
+
+    def __borrow(self) -> _Channel:
+        """
+        Take an idle further connection, or a new one if the pool is not exhausted, or wait for one.
+
+        :return: connection, not necessarily open
         """
-        Wrap the SFTP method in a retry loop.
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._opened < self.tuning.pool_size - 1:
+                self._opened += 1
+                return _Channel()
+
+        return self._idle.get()
+
+    def __wrap(self, method: Union[str, Callable[..., T]], *args, **kwargs) -> T:
+        """
+        Execute the SFTP method on the primary connection, or on a further connection from the pool if busy.
+
+        :param method: name of the paramiko.SFTP method, or a function accepting paramiko.SFTP as the first argument
+        :param args: positional arguments passed on to the method
+        :param kwargs: keyword arguments passed on to the method
+        :return: method's result
+        """
+        if self.tuning.pool_size <= 1:
+            return self.__execute(self._primary, method, *args, **kwargs)
+
+        if self._primary_lock.acquire(blocking=False):
+            try:
+                return self.__execute(self._primary, method, *args, **kwargs)
+            finally:
+                self._primary_lock.release()
+
+        channel = self.__borrow()
+        try:
+            return self.__execute(channel, method, *args, **kwargs)
+        finally:
+            self._idle.put(channel)
+
+    def __execute(self, channel: _Channel, method: Union[str, Callable[..., T]], *args, **kwargs) -> T:
+        """
+        Execute the SFTP method on the given connection in a retry loop.
 
         Open an SFTP connection, if necessary, and change to the last recorded working directory before
-        executing the method.
+        executing the method unless the connection is already there.
+
+        A broken connection is detected only by the failure of the method. If the method fails while
+        the connection is still alive, the error is considered to come from the method itself and it is re-raised
+        immediately. Otherwise, the connection is re-opened and the method is retried with an exponential back-off.
 
-        :param method: to be wrapped
+        :param channel: connection to be used
+        :param method: name of the paramiko.SFTP method, or a function accepting paramiko.SFTP as the first argument
+        :param args: positional arguments passed on to the method
+        :param kwargs: keyword arguments passed on to the method
         :return: method's result
         """
-        last_err = None  # type: Optional[Union[socket.error, EOFError]]
+        # pylint: disable=too-many-branches
+        last_err = None  # type: Optional[Union[socket.error, EOFError, paramiko.SSHException]]
+
+        deadline = None if self.tuning.timeout is None else time.monotonic() + self.tuning.timeout
 
-        success = False
-        for _ in range(0, self.max_retries):
+        for attempt in range(0, self.max_retries):
+            sftp = channel.sftp
             try:
-                if self._sftp is None:
-                    self._sftp = self.__sftp_opener()
-                assert self._sftp is not None
+                if sftp is None:
+                    with channel.reconnect_lock:
+                        # Another caller might have re-opened the connection in the meantime.
+                        if channel.sftp is None:
+                            channel.reset()
+                            channel.sftp = self.__sftp_opener() if channel.opener is None else channel.opener()
 
-                if self._sftp.sock.closed:
-                    self._sftp = self.__sftp_opener()
-                assert not self._sftp.sock.closed
+                        sftp = channel.sftp
 
-                if self.last_working_directory is not None:
-                    self._sftp.chdir(path=self.last_working_directory)
+                if self.last_working_directory is not None and channel.cwd != self.last_working_directory:
+                    sftp.chdir(path=self.last_working_directory)
+                    channel.cwd = self.last_working_directory
 
-                success = True
+                if isinstance(method, str):
+                    bound_method = channel.method_cache.get(method, None)
+                    if bound_method is None:
+                        bound_method = getattr(sftp, method)
+                        if channel.sftp is sftp:
+                            channel.method_cache[method] = bound_method
+
+                    return bound_method(*args, **kwargs)
+
+                return method(sftp, *args, **kwargs)
+
+            except (paramiko.AuthenticationException, paramiko.BadHostKeyException):
+                # A retry can not fix the wrong credentials or an untrusted host.
+                raise
+
+            except (socket.error, EOFError, paramiko.SSHException) as err:
+                if sftp is not None and self._is_alive(sftp=sftp):
+                    # The connection is fine so that the error comes from the operation itself.
+                    raise
 
-            except (socket.error, EOFError) as err:
                 last_err = err
 
-                if self._sftp is not None:
-                    self._sftp.close()
-                    self._sftp = None
+                with channel.reconnect_lock:
+                    # Do not close a connection which has been already re-opened by another caller.
+                    if channel.sftp is sftp:
+                        channel.reset()
+
+                if attempt == self.max_retries - 1:
+                    # There is nothing to wait for after the last attempt.
+                    break
+
+                # Add a jitter so that the clients disconnected at the same time do not reconnect all at once.
+                backoff = min(self.retry_period * 2**attempt + random.uniform(0, self.retry_period),
+                              self.tuning.max_backoff)
+
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ConnectionError(
+                            "Failed to execute an SFTP command within {} seconds due to connection failure: {}".format(
+                                self.tuning.timeout, last_err)) from last_err
+
+                    backoff = min(backoff, remaining)
+
+                time.sleep(backoff)
+
+        raise ConnectionError("Failed to execute an SFTP command after {} retries due to connection failure: {}".format(
+            self.max_retries, last_err)) from last_err
+
+    def call(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Execute the function on a single SFTP connection in the retry loop.
+
+        Use this method if the function issues multiple requests which need to go over the same connection,
+        *e.g.*, if it opens a remote file and reads it. Mind that the stat cache is not cleared so that you need to
+        call ``clear_stat_cache`` if the function modifies the remote file system.
+
+        :param function: accepting paramiko.SFTP as the first argument
+        :param args: positional arguments passed on to the function
+        :param kwargs: keyword arguments passed on to the function
+        :return: function's result
+        """
+        return self.__wrap(function, *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        """
+        Wrap any other public method of paramiko.SFTP in the retry loop.
+
+        Unless the method is known to only read, the stat cache is cleared on each call since the method
+        might modify the remote file system.
+
+        :param name: of the paramiko.SFTP method
+        :return: proxy to the method
+        :raise: AttributeError if paramiko.SFTP has no such public method
+        """
+        if name.startswith('_') or not callable(getattr(paramiko.SFTPClient, name, None)):
+            raise AttributeError("{!r} object has no attribute {!r}".format(type(self).__name__, name))
+
+        if name == 'chdir':
+            raise AttributeError("Set last_working_directory instead of calling chdir on {!r}".format(
+                type(self).__name__))
+
+        proxy = self._proxies.get(name, None)
+        if proxy is None:
+            read_only = name in _READ_ONLY_METHODS
+
+            def wrapped(*args, **kwargs):
+                """Execute the paramiko.SFTP method in the retry loop."""
+                if not read_only:
+                    self.clear_stat_cache()
+
+                return self.__wrap(name, *args, **kwargs)
+
+            proxy = wrapped
+            self._proxies[name] = proxy
+
+        return proxy
 
-                time.sleep(self.retry_period)
+    def _cache_key(self, path: str) -> str:
+        """
+        Normalize the remote path so that it can be used as a key in the cache.
+
+        A relative path is resolved against the last recorded working directory, or against the login directory
+        if no working directory has been recorded so that the path and its absolute alias share the key.
+
+        :param path: to the remote file
+        :return: normalized absolute path
+        """
+        if not posixpath.isabs(path):
+            if self.last_working_directory is not None:
+                path = posixpath.join(self.last_working_directory, path)
+            else:
+                if self._login_directory is None:
+                    # The login directory does not change on reconnect so that it needs to be fetched only once.
+                    self._login_directory = self.__wrap('normalize', '.')
+
+                path = posixpath.join(self._login_directory, path)
+
+        return posixpath.normpath(path)
+
+    def _invalidate(self, path: str) -> None:
+        """
+        Remove the cached stats of the remote path and of all the paths beneath it as well as the listing of its parent.
+
+        :param path: to the remote file or directory
+        :return:
+        """
+        if not self._stat_cache and not self._listdir_cache:
+            return
+
+        key = self._cache_key(path=path)
+        prefix = key if key.endswith('/') else key + '/'
+
+        for cache in [self._stat_cache, self._listdir_cache]:
+            for cached_key in list(cache.keys()):
+                if cached_key == key or cached_key.startswith(prefix):
+                    cache.pop(cached_key, None)
 
-        if not success:
-            raise ConnectionError(
-                "Failed to execute an SFTP command after {} retries due to connection failure: {}".format(
-                    self.max_retries, last_err))
+        self._listdir_cache.pop(posixpath.dirname(key), None)
 
-        return method(self._sftp)
+    def clear_stat_cache(self) -> None:
+        """Forget all the cached stats, *e.g.*, after the remote file system was modified by a command."""
+        self._stat_cache.clear()
+        self._listdir_cache.clear()
+
+    def _cached_listing(self, key: str) -> Optional[Dict[str, paramiko.SFTPAttributes]]:
+        """
+        Retrieve the listing of the directory from the cache.
+
+        :param key: normalized path to the remote directory
+        :return: entry name -> attributes, or None if the listing has not been cached or it is stale
+        """
+        cached = self._listdir_cache.get(key, None)
+        if cached is None:
+            return None
+
+        timestamp, entries = cached
+        if time.monotonic() - timestamp >= self.tuning.stat_ttl:
+            return None
+
+        return entries
 
     def listdir_attr(self, path='.'):
-        """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.listdir_attr(path))
+        """See paramiko.SFTP documentation. The listing is cached for the subsequent ``stat`` calls."""
+        result = self.__wrap('listdir_attr', path)
+
+        if self.tuning.stat_ttl > 0:
+            self._listdir_cache[self._cache_key(path=path)] = (time.monotonic(),
+                                                               {attr.filename: attr
+                                                                for attr in result})
+
+        return result
+
+    def listdir_attr_cached(self, path='.'):
+        """
+        List the directory or reuse its listing if it is still in the cache.
+
+        :param path: to the remote directory
+        :return: attributes of the entries
+        """
+        entries = self._cached_listing(key=self._cache_key(path=path))
+        if entries is not None:
+            return list(entries.values())
+
+        return self.listdir_attr(path=path)
 
     @icontract.ensure(lambda result: all('/' not in name for name in result))
     def listdir(self, path='.'):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.listdir(path))
+        return self.__wrap('listdir', path)
 
     def remove(self, path):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.remove(path))
+        self._invalidate(path=path)
+        return self.__wrap('remove', path)
 
     unlink = remove
 
     def posix_rename(self, oldpath, newpath):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.posix_rename(oldpath, newpath))
+        self._invalidate(path=oldpath)
+        self._invalidate(path=newpath)
+        return self.__wrap('posix_rename', oldpath, newpath)
+
+    def posix_renames(self, pairs: Sequence[Tuple[str, str]]) -> List[Optional[OSError]]:
+        """
+        Rename multiple files in a single round trip by pipelining the requests.
+
+        The server processes the requests in order. Mind that the renames are not atomic as a whole; if the connection
+        breaks, all the renames are requested again and the already renamed files are reported as errors.
+
+        :param pairs: old path and new path for each file
+        :return: error for each rename, or None if the file was renamed
+        """
+        for oldpath, newpath in pairs:
+            self._invalidate(path=oldpath)
+            self._invalidate(path=newpath)
+
+        return self.__wrap(_pipeline.posix_renames, pairs=pairs)
 
     def mkdir(self, path, mode=0o777):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.mkdir(path, mode))
+        self._invalidate(path=path)
+        return self.__wrap('mkdir', path, mode)
+
+    def mkdirs(self, paths: Sequence[str], mode: int = 0o777) -> List[Optional[OSError]]:
+        """
+        Create multiple directories in a single round trip by pipelining the requests.
+
+        The server processes the requests in order so that the parents need to precede their children.
+
+        :param paths: to the directories
+        :param mode: directory permission mode
+        :return: error for each directory, or None if the directory was created
+        """
+        for path in paths:
+            self._invalidate(path=path)
+
+        return self.__wrap(_pipeline.mkdirs, paths=paths, mode=mode)
 
     def rmdir(self, path):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.rmdir(path))
+        self._invalidate(path=path)
+        return self.__wrap('rmdir', path)
+
+    def _peek_stat(self, key: str) -> Any:
+        """
+        Look up the result of ``stat`` in the caches without a round trip.
+
+        :param key: normalized path to the remote file
+        :return: attributes, _MISSING if the file is known not to exist, or None if unknown
+        """
+        cached = self._stat_cache.get(key, None)
+        if cached is not None:
+            timestamp, attributes = cached
+            if time.monotonic() - timestamp < self.tuning.stat_ttl:
+                return attributes
+
+        parent, name = posixpath.split(key)
+        if parent != '' and name not in ['', '.', '..']:
+            entries = self._cached_listing(key=parent)
+            if entries is not None:
+                if name not in entries:
+                    return _MISSING
+
+                # The entries of a listing are not followed if they are symbolic links.
+                if not stat_module.S_ISLNK(entries[name].st_mode or 0):
+                    return entries[name]
+
+        return None
+
+    def is_known_directory(self, path: str) -> bool:
+        """
+        Check in the caches without a round trip whether the path is known to be a directory.
+
+        :param path: to the remote file
+        :return: True if a fresh cached result shows a directory, False if it does not or if nothing is cached
+        """
+        if self.tuning.stat_ttl <= 0:
+            return False
+
+        attributes = self._peek_stat(key=self._cache_key(path=path))
+        return attributes is not None and attributes is not _MISSING and stat_module.S_ISDIR(attributes.st_mode or 0)
 
     def stat(self, path):
-        """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.stat(path))
+        """See paramiko.SFTP documentation. The result is cached for ``stat_ttl`` seconds."""
+        key = self._cache_key(path=path)
+
+        attributes = self._peek_stat(key=key)
+        if attributes is _MISSING:
+            raise FileNotFoundError(errno.ENOENT, "No such file")
+
+        if attributes is not None:
+            return attributes
+
+        try:
+            attributes = self.__wrap('stat', path)
+        except FileNotFoundError:
+            if self.tuning.stat_ttl > 0:
+                self._stat_cache[key] = (time.monotonic(), _MISSING)
+            raise
+
+        if self.tuning.stat_ttl > 0:
+            self._stat_cache[key] = (time.monotonic(), attributes)
+
+        return attributes
 
     def lstat(self, path):
-        """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.lstat(path))
+        """
+        See paramiko.SFTP documentation.
+
+        A fresh cached listing of the parent directory is used instead of a round trip. If the path is not
+        a symbolic link, the result is also cached for the subsequent ``stat``.
+        """
+        key = self._cache_key(path=path)
+
+        parent, name = posixpath.split(key)
+        if parent != '' and name not in ['', '.', '..']:
+            entries = self._cached_listing(key=parent)
+            if entries is not None:
+                if name not in entries:
+                    raise FileNotFoundError(errno.ENOENT, "No such file")
+
+                return entries[name]
+
+        attributes = self.__wrap('lstat', path)
+
+        if self.tuning.stat_ttl > 0 and not stat_module.S_ISLNK(attributes.st_mode or 0):
+            self._stat_cache[key] = (time.monotonic(), attributes)
+
+        return attributes
+
+    def stats(self, paths: Sequence[str]) -> List[Optional[paramiko.SFTPAttributes]]:
+        """
+        Stat multiple paths in a single round trip by pipelining the requests.
+
+        The paths with fresh cached results are not requested again.
+
+        :param paths: to the files
+        :return: attributes for each path, or None if the file does not exist
+        """
+        keys = [self._cache_key(path=path) for path in paths]
+
+        result = [None] * len(paths)  # type: List[Optional[paramiko.SFTPAttributes]]
+        to_request = []  # type: List[int]
+        for i, key in enumerate(keys):
+            attributes = self._peek_stat(key=key)
+            if attributes is None:
+                to_request.append(i)
+            elif attributes is not _MISSING:
+                result[i] = attributes
+
+        if not to_request:
+            return result
+
+        fetched = self.__wrap(_pipeline.stats, paths=[paths[i] for i in to_request])
+
+        now = time.monotonic()
+        for i, attributes in zip(to_request, fetched):
+            result[i] = attributes
+            if self.tuning.stat_ttl > 0:
+                self._stat_cache[keys[i]] = (now, _MISSING if attributes is None else attributes)
+
+        return result
 
     def symlink(self, source, dest):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.symlink(source, dest))
+        self._invalidate(path=dest)
+        return self.__wrap('symlink', source, dest)
 
     def chmod(self, path, mode):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.chmod(path, mode))
+        self._invalidate(path=path)
+        return self.__wrap('chmod', path, mode)
 
     def chown(self, path, uid, gid):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.chown(path, uid, gid))
+        self._invalidate(path=path)
+        return self.__wrap('chown', path, uid, gid)
+
+    def setstat(self, path: str, mode: int, uid: int, gid: int) -> None:
+        """
+        Change the permissions and the ownership of the remote file in a single round trip.
+
+        :param path: to the remote file
+        :param mode: permission mode
+        :param uid: user ID of the owner
+        :param gid: group ID of the owner
+        :return:
+        """
+        self._invalidate(path=path)
+        self.__wrap(_pipeline.setstat, path=path, mode=mode, uid=uid, gid=gid)
+
+    def open(self, filename, mode='r', bufsize=-1):
+        """
+        See paramiko.SFTP documentation.
+
+        If the file is opened for writing, its cached stats are invalidated both now and once the file is closed.
+        """
+        if not any(char in mode for char in 'wax+'):
+            return self.__wrap('open', filename, mode, bufsize)
+
+        self._invalidate(path=filename)
+        fid = self.__wrap('open', filename, mode, bufsize)
+
+        old_close = fid.close
+
+        # Hack the close so that the stats cached while the file was written are invalidated as well.
+        def close() -> None:
+            """Close the remote file and invalidate its cached stats."""
+            try:
+                old_close()
+            finally:
+                self._invalidate(path=filename)
+
+        fid.close = close
+
+        return fid
 
     def put(self, localpath, remotepath, callback=None, confirm=True):
         """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.put(localpath, remotepath, callback, confirm))
+        self._invalidate(path=remotepath)
+        return self.__wrap('put', localpath, remotepath, callback, confirm)
+
+    def put_bytes(self, data: bytes, remotepath: str, confirm: bool = True) -> paramiko.SFTPAttributes:
+        """
+        Write the data to the remote path without waiting for the acknowledgement of each written chunk.
+
+        :param data: to be written
+        :param remotepath: to the remote file
+        :param confirm: if set, checks the size of the remote file after the transfer
+        :return: attributes of the remote file if ``confirm`` is set, empty attributes otherwise
+        """
+        self._invalidate(path=remotepath)
+        return self.__wrap(_pipeline.put_bytes, data=data, remotepath=remotepath, confirm=confirm)
 
     def get(self, remotepath, localpath, callback=None):
-        """See paramiko.SFTP documentation."""
-        return self.__wrap(method=lambda sftp: sftp.get(remotepath, localpath, callback))
+        """See paramiko.SFTP documentation. At most ``max_requests`` reads of the remote file are in flight."""
+        return self.__wrap(
+            _pipeline.get,
+            remotepath=remotepath,
+            localpath=localpath,
+            callback=callback,
+            max_requests=self.tuning.max_requests)
+
+    def __open_further_channel(self) -> paramiko.SFTP:
+        """
+        Open a further SFTP channel on the SSH connection of the pool with the same window and packet size.
+
+        :return: SFTP client on the new channel
+        :raise: paramiko.SSHException if the server refuses to open the channel
+        """
+        pooled_channel = self.__wrap(lambda sftp: sftp.get_channel())
+
+        sftp = paramiko.SFTPClient.from_transport(
+            pooled_channel.get_transport(),
+            window_size=pooled_channel.in_window_size,
+            max_packet_size=pooled_channel.in_max_packet_size)
+        if sftp is None:
+            raise paramiko.SSHException("Failed to open a further SFTP channel")
+
+        return sftp
+
+    def _transfer_many(self, transfer: Callable[..., Any], kwargs_list: List[Dict[str, Any]],
+                       max_concurrency: int) -> None:
+        """
+        Execute the transfers concurrently, each on a dedicated SFTP channel multiplexed on the same SSH connection.
+
+        Each transfer is retried on its channel if the connection breaks.
+
+        :param transfer: function accepting the SFTP client as the first argument
+        :param kwargs_list: keyword arguments of each transfer
+        :param max_concurrency: maximum number of SFTP channels used at the same time
+        :return:
+        :raise: the error of the first failed transfer after all the transfers finished
+        """
+        if not kwargs_list:
+            return
+
+        channels = []  # type: List[_Channel]
+        try:
+            for _ in range(min(max_concurrency, len(kwargs_list))):
+                channel = _Channel(opener=self.__open_further_channel)
+                try:
+                    channel.sftp = self.__open_further_channel()
+                except paramiko.SSHException:
+                    # The server refuses to open further sessions (e.g., due to its MaxSessions setting).
+                    break
+
+                channels.append(channel)
+
+            if not channels:
+                for kwargs in kwargs_list:
+                    self.__wrap(transfer, **kwargs)
+                return
+
+            idle_channels = queue.Queue()  # type: queue.Queue
+            for channel in channels:
+                idle_channels.put(channel)
+
+            def execute(kwargs: Dict[str, Any]) -> None:
+                """Execute the transfer on an idle channel."""
+                channel = idle_channels.get()
+                try:
+                    self.__execute(channel, transfer, **kwargs)
+                finally:
+                    idle_channels.put(channel)
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(channels)) as executor:
+                futures = [executor.submit(execute, kwargs) for kwargs in kwargs_list]
+
+            for future in futures:
+                err = future.exception()
+                if err is not None:
+                    raise err
+
+        finally:
+            for channel in channels:
+                channel.reset()
+
+    def put_many(self, pairs: Sequence[Tuple[str, str]], max_concurrency: int = 8) -> None:
+        """
+        Copy multiple local files to the remote host concurrently over multiple SFTP channels.
+
+        Mind that SSH servers limit the number of sessions per connection (OpenSSH defaults to 10 with MaxSessions).
+        If the server refuses to open more channels, the transfers are distributed over the channels opened so far.
+        The channels are opened with the same window and packet size as the channels of the pool. If the connection
+        breaks, each transfer is retried like the other methods.
+
+        :param pairs: local path and remote path for each file
+        :param max_concurrency: maximum number of SFTP channels used at the same time
+        :return:
+        :raise: the error of the first failed transfer after all the transfers finished
+        """
+        for _, remotepath in pairs:
+            self._invalidate(path=remotepath)
+
+        self._transfer_many(
+            transfer=paramiko.SFTPClient.put,
+            kwargs_list=[{
+                'localpath': localpath,
+                'remotepath': remotepath
+            } for localpath, remotepath in pairs],
+            max_concurrency=max_concurrency)
+
+    def get_many(self, pairs: Sequence[Tuple[str, str]], max_concurrency: int = 8) -> None:
+        """
+        Copy multiple remote files to the local machine concurrently over multiple SFTP channels.
+
+        See ``put_many`` for the limits on the number of channels and the retries.
+
+        :param pairs: remote path and local path for each file
+        :param max_concurrency: maximum number of SFTP channels used at the same time
+        :return:
+        :raise: the error of the first failed transfer after all the transfers finished
+        """
+        self._transfer_many(
+            transfer=_pipeline.get,
+            kwargs_list=[{
+                'remotepath': remotepath,
+                'localpath': localpath,
+                'max_requests': self.tuning.max_requests
+            } for remotepath, localpath in pairs],
+            max_concurrency=max_concurrency)
+
+
+def _stats(sftp: Union[paramiko.SFTP, ReconnectingSFTP],
+           paths: Sequence[str]) -> List[Optional[paramiko.SFTPAttributes]]:
+    """
+    Stat multiple paths in a single round trip.
+
+    :param sftp: SFTP client
+    :param paths: to the files
+    :return: attributes for each path, or None if the file does not exist
+    """
+    if not paths:
+        return []
+
+    if isinstance(sftp, ReconnectingSFTP):
+        return sftp.stats(paths=paths)
+
+    return _pipeline.stats(sftp=sftp, paths=paths)
+
+
+def _mkdirs(sftp: Union[paramiko.SFTP, ReconnectingSFTP], paths: Sequence[str],
+            mode: int = 0o777) -> List[Optional[OSError]]:
+    """
+    Create multiple directories in a single round trip.
+
+    :param sftp: SFTP client
+    :param paths: to the directories; parents need to precede their children
+    :param mode: directory permission mode
+    :return: error for each directory, or None if the directory was created
+    """
+    if isinstance(sftp, ReconnectingSFTP):
+        return sftp.mkdirs(paths=paths, mode=mode)
+
+    return _pipeline.mkdirs(sftp=sftp, paths=paths, mode=mode)
+
+
+def _put_bytes(sftp: Union[paramiko.SFTP, ReconnectingSFTP], data: bytes, remotepath: str) -> None:
+    """
+    Write the data to the remote path with pipelined writes.
+
+    :param sftp: SFTP client
+    :param data: to be written
+    :param remotepath: to the remote file
+    :return:
+    """
+    if isinstance(sftp, ReconnectingSFTP):
+        sftp.put_bytes(data=data, remotepath=remotepath)
+        return
+
+    _pipeline.put_bytes(sftp=sftp, data=data, remotepath=remotepath)
+
+
+def _setstat(sftp: Union[paramiko.SFTP, ReconnectingSFTP], path: str, mode: int, uid: int, gid: int) -> None:
+    """
+    Change the permissions and the ownership of the remote file with a single request.
+
+    If the SFTP client does not support the request, chmod and chown are sent one after another.
+
+    :param sftp: SFTP client
+    :param path: to the remote file
+    :param mode: permission mode
+    :param uid: user ID of the owner
+    :param gid: group ID of the owner
+    :return:
+    """
+    if isinstance(sftp, ReconnectingSFTP):
+        sftp.setstat(path=path, mode=mode, uid=uid, gid=gid)
+        return
+
+    _pipeline.setstat(sftp=sftp, path=path, mode=mode, uid=uid, gid=gid)
+
+
+def _posix_str(remote_path: Union[str, pathlib.Path]) -> str:
+    """
+    Convert the remote path to a string in POSIX form.
+
+    :param remote_path: to be converted
+    :return: POSIX representation of the path
+    :raise: TypeError if the path is neither a string nor a path-like object
+    """
+    if isinstance(remote_path, str):
+        return remote_path
+
+    if hasattr(os, 'fspath'):
+        return os.fspath(remote_path).replace(os.sep, '/')
+
+    # os.fspath is not available in Python 3.5.
+    if isinstance(remote_path, pathlib.PurePath):
+        return remote_path.as_posix()
+
+    raise TypeError("Unhandled type of remote path: {}".format(type(remote_path)))
 
 
 def _exists(sftp: Union[paramiko.SFTP, ReconnectingSFTP], remote_path: Union[str, pathlib.Path]) -> bool:
@@ -158,27 +945,177 @@ def _exists(sftp: Union[paramiko.SFTP, ReconnectingSFTP], remote_path: Union[str
     :param remote_path: to the file
     :return: True if the file exists on the remote machine at `remote_path`
     """
-    if isinstance(remote_path, str):
-        rmt_pth_str = remote_path
-    elif isinstance(remote_path, pathlib.Path):
-        rmt_pth_str = remote_path.as_posix()
-    else:
-        raise NotImplementedError("Unhandled type of remote path: {}".format(type(remote_path)))
+    rmt_pth_str = _posix_str(remote_path=remote_path)
 
-    permerr = None  # type: Optional[PermissionError]
     try:
         sftp.stat(rmt_pth_str)
         return True
     except FileNotFoundError:
         return False
+    except PermissionError as err:
+        raise PermissionError("The remote path could not be accessed: {}".format(rmt_pth_str)) from err
+
+
+def _stat_batch(sftp: Union[paramiko.SFTP, ReconnectingSFTP],
+                remote_paths: Sequence[Union[str, pathlib.Path]]) -> List[Optional[paramiko.SFTPAttributes]]:
+    """
+    Stat multiple remote paths with a single listing of each parent directory instead of a stat for each path.
+
+    The symbolic links are followed by stat'ing them. A path alone in its parent directory is stat'ed as well
+    since listing the whole directory would be more expensive. All these stats are pipelined in a single round trip.
+
+    :param sftp: SFTP client
+    :param remote_paths: to the files
+    :return: attributes for each path, or None if the file does not exist
+    """
+    result = [None] * len(remote_paths)  # type: List[Optional[paramiko.SFTPAttributes]]
+
+    # indices and paths to be stat'ed individually
+    singles = []  # type: List[Tuple[int, str]]
+
+    # parent directory -> indices and names of the entries
+    groups = collections.OrderedDict()  # type: Dict[str, List[Tuple[int, str]]]
+    for i, remote_path in enumerate(remote_paths):
+        rmt_pth_str = posixpath.normpath(_posix_str(remote_path=remote_path))
+        parent, name = posixpath.split(rmt_pth_str)
+
+        if name in ['', '.', '..']:
+            singles.append((i, rmt_pth_str))
+            continue
+
+        groups.setdefault(parent or '.', []).append((i, name))
+
+    for parent, entries in groups.items():
+        if len(entries) == 1:
+            i, name = entries[0]
+            singles.append((i, posixpath.join(parent, name)))
+            continue
+
+        try:
+            if isinstance(sftp, ReconnectingSFTP):
+                listing = sftp.listdir_attr_cached(parent)
+            else:
+                listing = sftp.listdir_attr(parent)
+
+        except PermissionError:
+            # The directory might be searchable, but not readable.
+            singles.extend((i, posixpath.join(parent, name)) for i, name in entries)
+            continue
+
+        except OSError:
+            # The parent does not exist or is not a directory so that none of the entries can exist.
+            continue
+
+        attributes = {attr.filename: attr for attr in listing}
+        for i, name in entries:
+            attr = attributes.get(name, None)
+            if attr is not None and stat_module.S_ISLNK(attr.st_mode or 0):
+                singles.append((i, posixpath.join(parent, name)))
+            else:
+                result[i] = attr
+
+    for (i, _), attr in zip(singles, _stats(sftp=sftp, paths=[path for _, path in singles])):
+        result[i] = attr
+
+    return result
+
+
+def _walk(sftp: Union[paramiko.SFTP, ReconnectingSFTP],
+          remote_path: str) -> Iterator[Tuple[str, paramiko.SFTPAttributes]]:
+    """
+    Iterate over all the files and directories beneath the remote directory.
+
+    Only a single directory is held in memory at a time. A plain paramiko client reads the entries with pipelined
+    ``listdir_iter`` requests; the directory is read completely before its entries are yielded so that the caller
+    can issue further requests in between. The reconnecting client lists each directory with ``listdir_attr``
+    (or reuses its cached listing) since a half-read directory could not be resumed on a new connection.
+
+    :param sftp: SFTP client
+    :param remote_path: to the directory
+    :return: iterator of the paths relative to ``remote_path`` together with their attributes
+    """
+    stack = ['']  # type: List[str]
+
+    while stack:
+        rel_dir = stack.pop()
+        directory = posixpath.join(remote_path, rel_dir) if rel_dir else remote_path
+
+        if isinstance(sftp, ReconnectingSFTP):
+            entries = sftp.listdir_attr_cached(directory)  # type: List[paramiko.SFTPAttributes]
+        else:
+            entries = list(sftp.listdir_iter(directory))
+
+        for attr in entries:
+            rel_pth = posixpath.join(rel_dir, attr.filename) if rel_dir else attr.filename
+            if stat_module.S_ISDIR(attr.st_mode or 0):
+                stack.append(rel_pth)
+
+            yield rel_pth, attr
+
+
+def _exists_many(sftp: Union[paramiko.SFTP, ReconnectingSFTP],
+                 remote_paths: Sequence[Union[str, pathlib.Path]]) -> List[bool]:
+    """
+    Check if multiple files exist on a remote machine with a single listing of each parent directory.
+
+    :param sftp: SFTP client
+    :param remote_paths: to the files
+    :return: for each path, True if the file exists on the remote machine
+    """
+    return [attr is not None for attr in _stat_batch(sftp=sftp, remote_paths=remote_paths)]
+
+
+def _mkdir_error(directory: str, err: OSError) -> OSError:
+    """
+    Wrap the error of mkdir so that the message includes the directory.
+
+    :param directory: which could not be created
+    :param err: raised by mkdir
+    :return: PermissionError if the error was due to permissions, a generic OSError otherwise
+    """
+    msg = "Failed to create the directory {}: {}".format(directory, err)
+    if isinstance(err, PermissionError):
+        return PermissionError(msg)
+
+    return OSError(msg)
+
+
+def _mkdir_parents(sftp: Union[paramiko.SFTP, ReconnectingSFTP], directory: str, mode: int) -> None:
+    """
+    Create the remote directory together with its missing parents in the manner of ``mkdir -p``.
+
+    The directory is created optimistically and the parents are visited only if it fails, so that
+    only the missing part of the path costs round trips.
+
+    :param sftp: SFTP client
+    :param directory: normalized POSIX path to the directory to be created
+    :param mode: directory permission mode
+    :return:
+    """
+    try:
+        sftp.mkdir(path=directory, mode=mode)
+        return
+    except FileNotFoundError as err:
+        parent = posixpath.dirname(directory)
+        if parent in ['', directory]:
+            raise _mkdir_error(directory=directory, err=err) from err
 
     except PermissionError as err:
-        permerr = err
+        raise _mkdir_error(directory=directory, err=err) from err
+
+    except OSError as err:
+        # SFTP servers report an already existing directory only as a generic failure.
+        if _exists(sftp=sftp, remote_path=directory):
+            return
+
+        raise _mkdir_error(directory=directory, err=err) from err
 
-    if permerr is not None:
-        raise PermissionError("The remote path could not be accessed: {}".format(rmt_pth_str))
+    _mkdir_parents(sftp=sftp, directory=parent, mode=mode)
 
-    raise AssertionError("Expected to raise before.")
+    try:
+        sftp.mkdir(path=directory, mode=mode)
+    except OSError as err:
+        raise _mkdir_error(directory=directory, err=err) from err
 
 
 def _mkdir(sftp: Union[paramiko.SFTP, ReconnectingSFTP],
@@ -197,63 +1134,62 @@ def _mkdir(sftp: Union[paramiko.SFTP, ReconnectingSFTP],
     :return:
     """
     # pylint: disable=too-many-branches
-    if isinstance(remote_path, str):
-        rmt_pth = pathlib.Path(os.path.normpath(remote_path))
-    elif isinstance(remote_path, pathlib.Path):
-        rmt_pth = pathlib.Path(os.path.normpath(remote_path.as_posix()))
-    else:
-        raise NotImplementedError("Unhandled type of remote path: {}".format(type(remote_path)))
+    rmt_pth_str = posixpath.normpath(_posix_str(remote_path=remote_path))
+
+    if not parents:
+        try:
+            sftp.mkdir(path=rmt_pth_str, mode=mode)
+            return
+        except FileNotFoundError as err:
+            raise FileNotFoundError(
+                "The parent remote directory {} does not exist, parents=False and we need to mkdir: {}".format(
+                    posixpath.dirname(rmt_pth_str) or '.', remote_path)) from err
+        except PermissionError as err:
+            raise _mkdir_error(directory=rmt_pth_str, err=err) from err
+        except OSError as err:
+            # SFTP servers report an already existing directory only as a generic failure.
+            if not _exists(sftp=sftp, remote_path=rmt_pth_str):
+                raise _mkdir_error(directory=rmt_pth_str, err=err) from err
 
-    if _exists(sftp=sftp, remote_path=remote_path):
         if not exist_ok:
             raise FileExistsError("The remote directory already exists: {}".format(remote_path))
-        else:
-            return
 
-    oserr = None  # type: Optional[OSError]
+        return
 
-    if not parents:
-        if not _exists(sftp=sftp, remote_path=rmt_pth.parent):
-            raise FileNotFoundError(
-                "The parent remote directory {} does not exist, parents=False and we need to mkdir: {}".format(
-                    rmt_pth.parent, remote_path))
+    # Spare the round trips if we already know that the directory exists.
+    if isinstance(sftp, ReconnectingSFTP) and sftp.is_known_directory(path=rmt_pth_str):
+        if not exist_ok:
+            raise FileExistsError("The remote directory already exists: {}".format(remote_path))
 
-        try:
-            sftp.mkdir(path=rmt_pth.as_posix(), mode=mode)
-        except OSError as err:
-            oserr = err
+        return
 
-        if oserr is not None:
-            msg = "Failed to create the directory {}: {}".format(rmt_pth.as_posix(), oserr)
-            if isinstance(oserr, PermissionError):
-                raise PermissionError(msg)
-            else:
-                raise OSError(msg)
-    else:
-        directories = list(reversed(rmt_pth.parents))
-        directories.append(rmt_pth)
+    # Try to create all the directories along the path in a single round trip. The requests for the existing
+    # directories simply fail.
+    directories = []  # type: List[str]
 
-        root = pathlib.Path('/')
+    pos = rmt_pth_str.find('/', 1)
+    while pos != -1:
+        directory = rmt_pth_str[:pos]
+        if directory not in ['.', '..'] and not directory.endswith('/..'):
+            directories.append(directory)
 
-        for directory in directories:
-            if directory == root:
-                continue
+        pos = rmt_pth_str.find('/', pos + 1)
 
-            directory_exists = _exists(sftp=sftp, remote_path=directory)
-            if directory_exists:
-                continue
+    directories.append(rmt_pth_str)
 
-            try:
-                sftp.mkdir(path=directory.as_posix(), mode=mode)
-            except OSError as err:
-                oserr = err
+    errors = _mkdirs(sftp=sftp, paths=directories, mode=mode)
+    if errors[-1] is None:
+        return
 
-            if oserr is not None:
-                msg = "Failed to create the directory {}: {}".format(directory.as_posix(), oserr)
-                if isinstance(oserr, PermissionError):
-                    raise PermissionError(msg)
-                else:
-                    raise OSError(msg)
+    # An existing directory is detected only by the failure of its mkdir.
+    if _exists(sftp=sftp, remote_path=rmt_pth_str):
+        if not exist_ok:
+            raise FileExistsError("The remote directory already exists: {}".format(remote_path))
+
+        return
+
+    # Go through the directories one by one to find the cause of the failure.
+    _mkdir_parents(sftp=sftp, directory=rmt_pth_str, mode=mode)
 
 
 def reconnecting_sftp(hostname: str,
@@ -267,7 +1203,14 @@ def reconnecting_sftp(hostname: str,
                       load_system_host_keys: Optional[bool] = True,
                       sock: Optional[socket.socket] = None,
                       max_retries: int = 10,
-                      retry_period: float = 0.1) -> ReconnectingSFTP:
+                      retry_period: float = 0.1,
+                      keepalive_interval: int = 30,
+                      share_connection: bool = False,
+                      window_size: Optional[int] = 4 * 1024 * 1024,
+                      max_packet_size: Optional[int] = None,
+                      socket_buffer_size: Optional[int] = None,
+                      compress: bool = False,
+                      tuning: Optional[Tuning] = None) -> ReconnectingSFTP:
     """
     Try to connect to the instance and retry on failure.
 
@@ -304,11 +1247,42 @@ def reconnecting_sftp(hostname: str,
     :param sock: an open socket or socket-like object to use for communication to the target host.
 
     :param max_retries: maximum number of retries before raising ConnectionError
-    :param retry_period: how long to wait between two retries; in seconds
+    :param retry_period: how long to wait before the first retry; in seconds
+    :param keepalive_interval:
+        how often to send a keepalive packet so that an idle connection is not dropped by the server
+        or by the NAT boxes in between; in seconds. Set to 0 to disable the keepalive packets.
+
+    :param share_connection:
+        if set, the SSH connection is shared with the other reconnecting SFTP clients connected to the same host
+        and port with the same credentials and host key settings so that each of them only opens its own SFTP
+        channel. Mind that closing the client then closes only its channel, while the connection is closed once
+        the last channel is closed. The servers limit the number of channels per connection (OpenSSH defaults to 10
+        with MaxSessions); once the limit is reached, a new connection is established.
+        Connections over a given ``sock`` are never shared.
+
+    :param window_size:
+        size of the SSH window of the SFTP channel in bytes. A larger window keeps more data in flight on the links
+        with a high round-trip time. If None, the paramiko default is used.
+
+    :param max_packet_size: maximum size of an SSH packet of the SFTP channel in bytes; if None, the paramiko default
+
+    :param socket_buffer_size:
+        size of the send and receive buffers of the TCP socket in bytes. If None, the operating system tunes
+        the buffers automatically, which is usually preferable; set it only if the automatic tuning is capped
+        below the bandwidth-delay product of the link.
+
+    :param compress:
+        if set, the SSH connection is compressed with zlib. This pays off for compressible data on slow links,
+        while on fast links the compression usually costs more CPU time than it saves in transfer time.
+        Only the connections with the same setting are shared.
+
+    :param tuning: further settings of the reconnecting SFTP client such as the size of its pool of channels
 
     :return: established reconnecting SFTP connection
     """
     # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-locals
+    # pylint: disable=too-many-statements
     private_key_file_str = None  # type: Optional[str]
 
     if private_key_file is not None:
@@ -320,11 +1294,23 @@ def reconnecting_sftp(hostname: str,
     if missing_host_key is None:
         missing_host_key = spur.ssh.MissingHostKey.raise_error
 
-    def open_sftp() -> paramiko.SFTP:
-        """Connect to the SFTP server."""
+    # Do not reuse a connection established with other credentials or a laxer host key policy.
+    key = _connection.ConnectionKey(
+        hostname=hostname,
+        port=port,
+        username=username,
+        password_digest=_connection.digest_password(password=password),
+        private_key_file=private_key_file_str,
+        look_for_private_keys=look_for_private_keys,
+        load_system_host_keys=load_system_host_keys,
+        missing_host_key=missing_host_key,
+        compress=compress)
+
+    def connect() -> paramiko.SSHClient:
+        """Establish a new SSH connection."""
         client = paramiko.SSHClient()
         if load_system_host_keys:
-            client.load_system_host_keys()
+            _connection.load_system_host_keys(client=client)
         client.set_missing_host_key_policy(policy=missing_host_key)
 
         assert port is not None
@@ -336,29 +1322,69 @@ def reconnecting_sftp(hostname: str,
             key_filename=private_key_file_str,
             look_for_keys=look_for_private_keys,
             timeout=connect_timeout,
-            sock=sock)
+            sock=sock,
+            compress=compress)
+
+        transport = client.get_transport()
+        _connection.tune_transport(transport=transport, socket_buffer_size=socket_buffer_size)
+        transport.set_keepalive(keepalive_interval)
+        if keepalive_interval > 0 and isinstance(transport.sock, socket.socket):
+            transport.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        return client
 
+    def open_channel(client: paramiko.SSHClient) -> paramiko.SFTP:
+        """Open an SFTP channel on the connection with the requested window and packet size."""
+        sftp = paramiko.SFTPClient.from_transport(
+            client.get_transport(), window_size=window_size, max_packet_size=max_packet_size)
+        if sftp is None:
+            raise paramiko.SSHException("Failed to open an SFTP channel to {}".format(hostname))
+
+        return sftp
+
+    def open_sftp() -> paramiko.SFTP:
+        """Open an SFTP channel on a shared SSH connection, or connect to the SFTP server anew."""
+        shared = None  # type: Optional[_connection.SharedClient]
         sftp = None  # type: Optional[paramiko.SFTP]
-        try:
-            sftp = client.open_sftp()
-        except Exception as err:
-            client.close()
-            raise err
 
+        if share_connection and sock is None:
+            shared = _connection.SharedClient.acquire(key=key)
+
+            if shared is not None:
+                try:
+                    sftp = open_channel(client=shared.client)
+                except paramiko.SSHException:
+                    # The server probably refuses more sessions on the connection.
+                    shared.release()
+                    shared = None
+
+        if sftp is None:
+            shared = _connection.SharedClient(client=connect())
+            try:
+                sftp = open_channel(client=shared.client)
+            except Exception as err:
+                shared.release()
+                raise err
+
+            if share_connection and sock is None:
+                shared.register(key=key)
+
+        assert shared is not None
         assert sftp is not None
 
         old_sftp_close = sftp.close
+        owner = shared
 
-        # Hack the close to close the underlying client as well.
+        # Hack the close to release the underlying client as well.
         def close() -> None:
-            """Close the SFTP connection and the underlying client as well."""
+            """Close the SFTP connection and the underlying client as well if no other channel uses it."""
             try:
                 old_sftp_close()
             finally:
-                client.close()
+                owner.release()
 
         sftp.close = close
 
         return sftp
 
-    return ReconnectingSFTP(sftp_opener=open_sftp, max_retries=max_retries, retry_period=retry_period)
+    return ReconnectingSFTP(sftp_opener=open_sftp, max_retries=max_retries, retry_period=retry_period, tuning=tuning)
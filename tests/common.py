@@ -2,14 +2,18 @@
 
 # pylint: disable=missing-docstring
 
+import atexit
+import concurrent.futures
+import functools
 import os
 import pathlib
 import getpass
-from typing import Optional  # pylint: disable=unused-import
+from typing import Optional, Sequence  # pylint: disable=unused-import
 
 import spur.ssh
 
 import spurplus
+import spurplus.sftp
 
 
 class Params:
@@ -23,18 +27,22 @@ class Params:
         self.private_key_file = None  # type: Optional[pathlib.Path]
 
 
+@functools.lru_cache(maxsize=1)
+def _local_username() -> str:
+    """retrieves the current local username only once since it might involve an NSS lookup."""
+    return getpass.getuser()
+
+
+@functools.lru_cache(maxsize=1)
 def params_from_environ() -> Params:
+    """parses the parameters from the environment only once; the result is shared and must not be modified."""
     params = Params()
     params.hostname = os.environ.get("TEST_SSH_HOSTNAME", "127.0.0.1")
 
     if 'TEST_SSH_PORT' in os.environ:
         params.port = int(os.environ['TEST_SSH_PORT'])
 
-    if 'TEST_SSH_USERNAME' in os.environ:
-        params.username = os.environ['TEST_SSH_USERNAME']
-    else:
-        # Get the current local username
-        params.username = getpass.getuser()
+    params.username = os.environ.get('TEST_SSH_USERNAME') or _local_username()
 
     if 'TEST_SSH_PASSWORD' in os.environ:
         params.password = str(os.environ['TEST_SSH_PASSWORD'])
@@ -45,6 +53,10 @@ def params_from_environ() -> Params:
     return params
 
 
+# number of the remote test files written at the same time, each over its own SFTP channel
+WRITE_WORKERS = 8
+
+
 def set_up_test_shell() -> spurplus.SshShell:
     """sets up a shell to the testing instance."""
     params = params_from_environ()
@@ -58,10 +70,55 @@ def set_up_test_shell() -> spurplus.SshShell:
             private_key_file=params.private_key_file,
             missing_host_key=spur.ssh.MissingHostKey.accept,
             retries=2,
-            retry_period=1)
+            retry_period=1,
+            sftp_pool_size=WRITE_WORKERS)
     except ConnectionError as err:
         raise ConnectionError("Failed to connect to {}@{}:{}, private key file: {}, password is not None: {}".format(
             params.username, params.hostname, params.port, params.private_key_file,
             params.password is not None)) from err
 
+    # open the SFTP channel now so that the first test does not pay for it
+    shell.as_sftp().normalize('.')
+
     return shell
+
+
+_SHARED_SHELL = None  # type: Optional[spurplus.SshShell]
+
+
+def shared_test_shell() -> spurplus.SshShell:
+    """
+    sets up a shell to the testing instance only once and shares it among the tests.
+
+    The tests sharing the shell need to keep their remote state in their own temporary directories.
+    The shell is closed on exit.
+    """
+    global _SHARED_SHELL  # pylint: disable=global-statement
+
+    if _SHARED_SHELL is None:
+        _SHARED_SHELL = set_up_test_shell()
+        atexit.register(_SHARED_SHELL.close)
+
+    return _SHARED_SHELL
+
+
+# creates a directory with a file and links to both; arguments: directory, file, link to the file, link to the directory
+TREE_WITH_LINKS_SCRIPT = 'mkdir "$1" && printf hello > "$2" && ln -s "$2" "$3" && ln -s "$1" "$4"'
+
+
+def arrange(shell: spurplus.SshShell, script: str, *args: str) -> None:
+    """arranges the remote test files with a single shell script instead of a round trip per file."""
+    shell.run(command=['sh', '-c', script, 'sh'] + list(args))
+
+
+def write_files(shell: spurplus.SshShell, remote_paths: Sequence[str], data: bytes) -> None:
+    """writes the data to the remote test files concurrently over the shell's SFTP channels; the parents must exist."""
+    sftp = shell.as_sftp()
+    assert isinstance(sftp, spurplus.sftp.ReconnectingSFTP)
+
+    def write(remote_path: str) -> None:
+        # open and write the file within a single call so that no other thread uses the same SFTP channel meanwhile
+        sftp.put_bytes(data=data, remotepath=remote_path, confirm=False)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        list(executor.map(write, remote_paths))
@@ -1,15 +1,21 @@
 #!/usr/bin/env python3
 
 # pylint: disable=missing-docstring
+import concurrent.futures
 import hashlib
 import io
+import os
 import pathlib
 import platform
+import posixpath
+import stat
 import time
 import unittest
 import uuid
-from typing import Optional, List  # pylint: disable=unused-import
+from typing import Any, Callable, Optional, List  # pylint: disable=unused-import
 
+import icontract
+import paramiko
 import temppathlib
 
 import spurplus
@@ -18,24 +24,38 @@ import tests.common
 
 # pylint: disable=too-many-lines
 
+# expected output of the spawned command in TestRun
+_HELLO_1000 = b"hello world\n" * 1000
+
+# MD5 checksum of the "hello" files, compared instead of reading the files back
+_HELLO_MD5 = hashlib.md5(b"hello").hexdigest()
+
 
 class TestReconnection(unittest.TestCase):
     def test_fail_connect_with_retries(self):
         connerr = None  # type: Optional[ConnectionError]
         try:
-            _ = spurplus.connect_with_retries(hostname="some-nonexisting-hostname.com", retries=2, retry_period=1)
+            _ = spurplus.connect_with_retries(hostname="some-nonexisting-hostname.com", retries=2, retry_period=0)
+        except ConnectionError as err:
+            connerr = err
+
+        self.assertIsNotNone(connerr)
+
+    def test_fail_fast_on_unresolved_host(self):
+        connerr = None  # type: Optional[ConnectionError]
+        try:
+            _ = spurplus.connect_with_retries(
+                hostname="some-nonexisting-hostname.com", retries=2, retry_period=1, retry_on_unresolved_host=False)
         except ConnectionError as err:
             connerr = err
 
         self.assertIsNotNone(connerr)
+        self.assertTrue(str(connerr).startswith("Failed to resolve the host name some-nonexisting-hostname.com: "))
 
 
 class TestProperties(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_hostname(self):
         params = tests.common.params_from_environ()
@@ -53,10 +73,7 @@ class TestProperties(unittest.TestCase):
 
 class TestTemporaryDirs(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_tmpdir(self):
         parent = pathlib.Path('/tmp') / str(uuid.uuid4())
@@ -107,10 +124,7 @@ class TestTemporaryDirs(unittest.TestCase):
 
 class TestRun(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_run(self):
         self.shell.run(command=['echo', 'hello world!'])
@@ -137,27 +151,33 @@ class TestRun(unittest.TestCase):
         self.assertEqual('hello world!\n', out)
 
     def test_stdout_redirection(self):
-        with io.StringIO() as buf:
-            self.shell.run(command=['echo', 'hello world!'], stdout=buf)
-            self.assertEqual("hello world!\n", buf.getvalue())
+        with io.BytesIO() as buf:
+            self.shell.run(command=['echo', 'hello world!'], stdout=buf, encoding=None)
+            self.assertEqual("hello world!\n", buf.getvalue().decode('ascii'))
 
     def test_spawn(self):
+        # Collect the raw bytes and compare them without decoding.
+        with io.BytesIO() as buf:
+            proc = self.shell.spawn(command=['sh', '-c', 'yes hello world | head -n 1000'], stdout=buf, encoding=None)
+            result = proc.wait_for_result()
+            self.assertEqual(0, result.return_code)
+
+            self.assertEqual(_HELLO_1000, buf.getvalue())
+
+    def test_spawn_discarding_stdout(self):
         with io.StringIO() as buf:
             proc = self.shell.spawn(
-                command=['bash', '-c', 'for i in `seq 1 1000`; do echo hello world; sleep 0.0001; done'], stdout=buf)
+                command=['bash', '-c', 'for i in `seq 1 1000`; do echo hello world; done'],
+                stdout=buf,
+                discard_stdout=True)
             result = proc.wait_for_result()
             self.assertEqual(0, result.return_code)
-
-            expected = ''.join(["hello world\n"] * 1000)
-            self.assertEqual(expected, buf.getvalue())
+            self.assertEqual('', buf.getvalue())
 
 
 class TestBasicIO(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_put_get(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
@@ -209,26 +229,25 @@ class TestBasicIO(unittest.TestCase):
                     self.shell.chmod(remote_path=remote_tmpdir.path, mode=0o777)
 
     def test_write_read_bytes(self):
+        # Each run writes to its own directory so that both runs share a temporary directory.
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            for consistent in [True, False]:
+                with self.subTest(consistent=consistent):
+                    pth = tmpdir.path / "some-dir-{}".format(consistent) / "some-file"
 
-        for consistent in [True, False]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-                pth = tmpdir.path / "some-dir" / str(consistent)
-
-                self.shell.write_bytes(remote_path=pth, data=b"hello", consistent=consistent)
-                data = self.shell.read_bytes(remote_path=pth)
-                self.assertEqual(b"hello", data)
+                    self.shell.write_bytes(remote_path=pth, data=b"hello", consistent=consistent)
+                    data = self.shell.read_bytes(remote_path=pth)
+                    self.assertEqual(b"hello", data)
 
     def test_read_bytes_no_permission(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir:
             pth = remote_tmpdir.path / "some-file"
             self.shell.write_bytes(remote_path=pth, data=b"hello")
-            try:
-                self.shell.chmod(remote_path=pth, mode=0o111)
+            self.shell.chmod(remote_path=pth, mode=0o111)
 
-                with self.assertRaises(PermissionError):
-                    self.shell.read_bytes(remote_path=pth)
-            finally:
-                self.shell.chmod(remote_path=pth, mode=0o777)
+            # The file needs no restored permissions since the writable temporary directory is removed with rm -rf.
+            with self.assertRaises(PermissionError):
+                self.shell.read_bytes(remote_path=pth)
 
     def test_read_bytes_not_found(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir:
@@ -243,69 +262,113 @@ class TestBasicIO(unittest.TestCase):
             self.assertEqual("The remote path was not found: {}".format(pth.as_posix()), str(notfounderr))
 
     def test_write_read_text(self):
-        for consistent in [True, False]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-                pth = tmpdir.path / "some-dir" / str(consistent)
+        # Each run writes to its own directory so that both runs share a temporary directory.
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            for consistent in [True, False]:
+                with self.subTest(consistent=consistent):
+                    pth = tmpdir.path / "some-dir-{}".format(consistent) / "some-file"
+
+                    self.shell.write_text(remote_path=pth, text="hello", consistent=consistent)
+                    text = self.shell.read_text(remote_path=pth)
+                    self.assertEqual("hello", text)
+
+    def test_open_write_read(self):
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            pth = tmpdir.path / "oi"
+
+            with self.shell.open(remote_path=pth, mode='wt') as fid:
+                fid.write("hello")
+
+            with self.shell.open(remote_path=pth, mode='rt') as fid:
+                self.assertEqual("hello", fid.read())
+
+            with self.shell.open(remote_path=pth, mode='ab') as fid:
+                fid.write(b" world")
+
+            with self.shell.open(remote_path=pth, mode='rb') as fid:
+                self.assertEqual(b"hello world", fid.read())
+
+    def test_bulk_put(self):
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            for i in range(0, 16):
+                pth = local_tmpdir.path / "some-dir" / "{}.txt".format(i)
+                pth.parent.mkdir(exist_ok=True)
+                pth.write_text("hello {}".format(i))
+
+            remote_dir = remote_tmpdir.path / "another-dir"
+            self.shell.bulk_put(local_path=local_tmpdir.path, remote_path=remote_dir)
+
+            self.assertListEqual(
+                sorted('{}.txt'.format(i) for i in range(0, 16)),
+                sorted(self.shell.as_sftp().listdir((remote_dir / "some-dir").as_posix())))
+            self.assertEqual("hello 3", self.shell.read_text(remote_path=remote_dir / "some-dir" / "3.txt"))
+
+    def test_bulk_put_follows_links(self):
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            (local_tmpdir.path / "some-file").write_text("hello")
+            (local_tmpdir.path / "some-link").symlink_to(local_tmpdir.path / "some-file")
+
+            remote_dir = remote_tmpdir.path / "another-dir"
+            self.shell.bulk_put(local_path=local_tmpdir.path, remote_path=remote_dir)
 
-                self.shell.write_text(remote_path=pth, text="hello", consistent=consistent)
-                text = self.shell.read_text(remote_path=pth)
-                self.assertEqual("hello", text)
+            sftp = self.shell.as_sftp()
+            remote_link_stat = sftp.lstat((remote_dir / "some-link").as_posix())
+            self.assertTrue(stat.S_ISREG(remote_link_stat.st_mode))
+            self.assertEqual(sftp.stat(remote_tmpdir.path.as_posix()).st_uid, remote_link_stat.st_uid)
+            self.assertEqual("hello", self.shell.read_text(remote_path=remote_dir / "some-link"))
 
 
 class TestMD5(unittest.TestCase):
-    def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
+    # The tests only write new files so that they can share a temporary directory, each in its own subdirectory.
+    @classmethod
+    def setUpClass(cls):
+        cls.shell = tests.common.shared_test_shell()
+        cls.tmpdir = spurplus.TemporaryDirectory(shell=cls.shell)
 
-    def tearDown(self):
-        self.shell.close()
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.__exit__(None, None, None)
+
+    def setUp(self):
+        self.tmpdir_path = self.tmpdir.path / self._testMethodName
 
     def test_md5(self):
-        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            pth = tmpdir.path / "oi"
+        pth = self.tmpdir_path / "oi"
 
-            self.shell.write_text(remote_path=pth, text="hello")
+        self.shell.write_text(remote_path=pth, text="hello")
 
-            md5digest = self.shell.md5(remote_path=pth)
+        md5digest = self.shell.md5(remote_path=pth)
 
-            expected = hashlib.md5("hello".encode()).hexdigest()
-            self.assertEqual(expected, md5digest)
+        self.assertEqual(_HELLO_MD5, md5digest)
 
     def test_md5_with_space(self):
-        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            pth = tmpdir.path / "oi hoi"
+        pth = self.tmpdir_path / "oi hoi"
 
-            self.shell.write_text(remote_path=pth, text="hello")
+        self.shell.write_text(remote_path=pth, text="hello")
 
-            md5digest = self.shell.md5(remote_path=pth)
+        md5digest = self.shell.md5(remote_path=pth)
 
-            expected = hashlib.md5("hello".encode()).hexdigest()
-            self.assertEqual(expected, md5digest)
+        self.assertEqual(_HELLO_MD5, md5digest)
 
     def test_md5s(self):
-        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            expected = []  # type: List[Optional[str]]
+        base = self.tmpdir_path.as_posix()
+        self.shell.mkdir(remote_path=base)
 
-            remote_pths = []  # type: List[pathlib.Path]
-            for i in range(0, 128):
-                pth = tmpdir.path / "{}.txt".format(i)
-                remote_pths.append(pth)
+        # only the files with even indices exist
+        remote_pths = ["{}/{}.txt".format(base, i) for i in range(0, 128)]  # type: List[str]
+        expected = [_HELLO_MD5 if i % 2 == 0 else None for i in range(0, 128)]  # type: List[Optional[str]]
 
-                if i % 2 == 0:
-                    self.shell.write_text(remote_path=pth, text="hello")
-                    expected.append(hashlib.md5("hello".encode()).hexdigest())
-                else:
-                    expected.append(None)
+        tests.common.write_files(self.shell, remote_pths[::2], b"hello")
 
-            md5s = self.shell.md5s(remote_paths=remote_pths)
-            self.assertListEqual(expected, md5s)
+        md5s = self.shell.md5s(remote_paths=remote_pths)
+        self.assertListEqual(expected, md5s)
 
 
 class TestFileOps(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_exists(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
@@ -362,10 +425,8 @@ class TestFileOps(unittest.TestCase):
             pth_to_dir_link = tmpdir.path / "some-link-to-dir"
             pth_to_nonexisting = tmpdir.path / "some-non-existing-file"
 
-            self.shell.mkdir(remote_path=pth_to_dir)
-            self.shell.write_text(remote_path=pth_to_file, text="hello")
-            self.shell.symlink(source=pth_to_file, destination=pth_to_file_link)
-            self.shell.symlink(source=pth_to_dir, destination=pth_to_dir_link)
+            tests.common.arrange(self.shell, tests.common.TREE_WITH_LINKS_SCRIPT, pth_to_dir.as_posix(),
+                                 pth_to_file.as_posix(), pth_to_file_link.as_posix(), pth_to_dir_link.as_posix())
 
             self.assertTrue(self.shell.is_dir(pth_to_dir))
             self.assertTrue(self.shell.is_dir(pth_to_dir_link))
@@ -390,10 +451,8 @@ class TestFileOps(unittest.TestCase):
             pth_to_dir_link = tmpdir.path / "some-link-to-dir"
             pth_to_nonexisting = tmpdir.path / "some-non-existing-file"
 
-            self.shell.mkdir(remote_path=pth_to_dir)
-            self.shell.write_text(remote_path=pth_to_file, text="hello")
-            self.shell.run(command=['ln', '-s', pth_to_file.as_posix(), pth_to_file_link.as_posix()])
-            self.shell.run(command=['ln', '-s', pth_to_dir.as_posix(), pth_to_dir_link.as_posix()])
+            tests.common.arrange(self.shell, tests.common.TREE_WITH_LINKS_SCRIPT, pth_to_dir.as_posix(),
+                                 pth_to_file.as_posix(), pth_to_file_link.as_posix(), pth_to_dir_link.as_posix())
 
             self.assertFalse(self.shell.is_symlink(pth_to_dir))
             self.assertTrue(self.shell.is_symlink(pth_to_dir_link))
@@ -476,47 +535,47 @@ class TestFileOps(unittest.TestCase):
 
 class TestRemove(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_file(self):
-        for recursive in [True, False]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-                # try to delete nonexisting file
-                notfounderr = None  # type: Optional[FileNotFoundError]
-                pth_to_file = tmpdir.path / "some-file"
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            for recursive in [True, False]:
+                with self.subTest(recursive=recursive):
+                    # try to delete nonexisting file
+                    notfounderr = None  # type: Optional[FileNotFoundError]
+                    pth_to_file = tmpdir.path / "some-file-{}".format(recursive)
 
-                try:
-                    self.shell.remove(remote_path=pth_to_file, recursive=recursive)
-                except FileNotFoundError as err:
-                    notfounderr = err
+                    try:
+                        self.shell.remove(remote_path=pth_to_file, recursive=recursive)
+                    except FileNotFoundError as err:
+                        notfounderr = err
 
-                self.assertEqual("Remote file does not exist and thus can not be removed: {}".format(
-                    pth_to_file.as_posix()), str(notfounderr))
+                    self.assertEqual("Remote file does not exist and thus can not be removed: {}".format(
+                        pth_to_file.as_posix()), str(notfounderr))
 
-                self.shell.write_text(remote_path=pth_to_file, text="hello")
+                    self.shell.write_text(remote_path=pth_to_file, text="hello")
 
-                self.assertTrue(self.shell.exists(remote_path=pth_to_file))
-                self.shell.remove(remote_path=pth_to_file, recursive=recursive)
-                self.assertFalse(self.shell.exists(remote_path=pth_to_file))
+                    self.assertTrue(self.shell.exists(remote_path=pth_to_file))
+                    self.shell.remove(remote_path=pth_to_file, recursive=recursive)
+                    self.assertFalse(self.shell.exists(remote_path=pth_to_file))
 
     def test_symlink(self):
-        for recursive in [True, False]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-                pth_to_file = tmpdir.path / "some-file"
-                self.shell.write_text(remote_path=pth_to_file, text="hello")
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            pth_to_file = tmpdir.path / "some-file"
+            self.shell.write_text(remote_path=pth_to_file, text="hello")
 
-                pth_to_file_link = tmpdir.path / "some-link-to-file"
-                self.shell.symlink(source=pth_to_file, destination=pth_to_file_link)
+            pth_to_file_link = tmpdir.path / "some-link-to-file"
 
-                self.assertTrue(self.shell.exists(remote_path=pth_to_file))
-                self.assertTrue(self.shell.exists(remote_path=pth_to_file_link))
-                self.shell.remove(remote_path=pth_to_file_link, recursive=recursive)
+            for recursive in [True, False]:
+                with self.subTest(recursive=recursive):
+                    self.shell.symlink(source=pth_to_file, destination=pth_to_file_link)
 
-                self.assertTrue(self.shell.exists(remote_path=pth_to_file))
-                self.assertFalse(self.shell.exists(remote_path=pth_to_file_link))
+                    self.assertTrue(self.shell.exists(remote_path=pth_to_file))
+                    self.assertTrue(self.shell.exists(remote_path=pth_to_file_link))
+                    self.shell.remove(remote_path=pth_to_file_link, recursive=recursive)
+
+                    self.assertTrue(self.shell.exists(remote_path=pth_to_file))
+                    self.assertFalse(self.shell.exists(remote_path=pth_to_file_link))
 
     def test_empty_dir(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
@@ -570,16 +629,27 @@ class TestRemove(unittest.TestCase):
 
             self.shell.remove(remote_path=pth_to_some_dir, recursive=True)
 
-            for pth in [pth_to_another_file, pth_to_file, pth_to_file_link, pth_to_subdir, pth_to_some_dir]:
-                self.assertFalse(self.shell.exists(remote_path=pth))
+            # Nothing beneath the directory can exist once the directory itself is gone.
+            self.assertListEqual([], self.shell.as_sftp().listdir(tmpdir.path.as_posix()))
+
+    def test_recursive_with_shell(self):
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            pth_to_some_dir = tmpdir.path / "some-dir"
+            pth_to_subdir = tmpdir.path / "some-dir/some-subdir"
+            pth_to_file = tmpdir.path / "some-dir/some-subdir/some-file"
+
+            self.shell.mkdir(remote_path=pth_to_subdir, parents=True)
+            self.shell.write_text(remote_path=pth_to_file, text="hello")
+
+            self.shell.remove(remote_path=pth_to_some_dir, recursive=True, use_shell=True)
+
+            # Nothing beneath the directory can exist once the directory itself is gone.
+            self.assertListEqual([], self.shell.as_sftp().listdir(tmpdir.path.as_posix()))
 
 
 class TestMirrorPermissions(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_local_permissions(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
@@ -671,10 +741,7 @@ class TestMirrorPermissions(unittest.TestCase):
 
 class TestSpurplusDirectoryDiff(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_nonexisting_remote_dir(self):
         with temppathlib.TemporaryDirectory() as local_tmpdir, \
@@ -704,11 +771,8 @@ class TestSpurplusDirectoryDiff(unittest.TestCase):
             local_tmpdir = pathlib.Path("nonexisting")
 
             # Set up remote
-            remote_only_dir = remote_tmpdir.path / "remote-only-dir"
-            self.shell.mkdir(remote_path=remote_only_dir)
-
-            remote_only_pth = remote_only_dir / "remote-only-file"
-            self.shell.write_text(remote_path=remote_only_pth, text="hello")
+            tests.common.arrange(self.shell, 'mkdir "$1" && printf hello > "$1/remote-only-file"',
+                                 (remote_tmpdir.path / "remote-only-dir").as_posix())
 
             dir_diff = self.shell.directory_diff(local_path=local_tmpdir, remote_path=remote_tmpdir.path)
 
@@ -783,20 +847,10 @@ class TestSpurplusDirectoryDiff(unittest.TestCase):
             local_different_file.write_text("hi")
 
             # Set up remote
-            remote_only_dir = remote_tmpdir.path / "remote-only-dir"
-            self.shell.mkdir(remote_path=remote_only_dir)
-
-            remote_only_pth = remote_only_dir / "remote-only-file"
-            self.shell.write_text(remote_path=remote_only_pth, text="hello")
-
-            remote_common_dir = remote_tmpdir.path / "common"
-            self.shell.mkdir(remote_path=remote_common_dir)
-
-            remote_identical_file = remote_common_dir / "identical-file"
-            self.shell.write_text(remote_path=remote_identical_file, text="hello")
-
-            remote_different_file = remote_common_dir / "different-file"
-            self.shell.write_text(remote_path=remote_different_file, text="zdravo")
+            tests.common.arrange(
+                self.shell, 'mkdir "$1" && printf hello > "$1/remote-only-file" && '
+                'mkdir "$2" && printf hello > "$2/identical-file" && printf zdravo > "$2/different-file"',
+                (remote_tmpdir.path / "remote-only-dir").as_posix(), (remote_tmpdir.path / "common").as_posix())
 
             # Diff
             dir_diff = self.shell.directory_diff(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
@@ -812,10 +866,7 @@ class TestSpurplusDirectoryDiff(unittest.TestCase):
 
 class TestSpurplusSyncToRemote(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_non_existing_remote_path(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
@@ -828,58 +879,56 @@ class TestSpurplusSyncToRemote(unittest.TestCase):
 
             self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
 
-            self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
-            self.assertEqual("hello", self.shell.read_text(remote_path=remote_pth_to_file))
+            self.assertEqual(_HELLO_MD5, self.shell.md5(remote_path=remote_pth_to_file))
 
     def test_files_differ(self):
+        # The names with spaces check that the paths are passed properly to the remote commands.
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
                 temppathlib.TemporaryDirectory() as local_tmpdir:
-            local_dir = local_tmpdir.path / "some-dir"
-            local_pth_to_file = local_dir / "some-file"
-            local_pth_to_file.parent.mkdir()
-            local_pth_to_file.write_text("hello")
+            for dirname, filename in [("some-dir", "some-file"), ("some dir", "some file")]:
+                with self.subTest(dirname=dirname, filename=filename):
+                    local_dir = local_tmpdir.path / dirname
+                    local_pth_to_file = local_dir / filename
+                    local_pth_to_file.parent.mkdir()
+                    local_pth_to_file.write_text("hello")
 
-            remote_dir = remote_tmpdir.path / "some-dir"
-            remote_pth_to_file = remote_dir / "some-file"
+                    remote_dir = remote_tmpdir.path / dirname
+                    remote_pth_to_file = remote_dir / filename
 
-            self.shell.mkdir(remote_path=remote_dir)
-            self.shell.write_text(remote_path=remote_pth_to_file, text="zdravo")
+                    tests.common.arrange(self.shell, 'mkdir "$1" && printf zdravo > "$2"', remote_dir.as_posix(),
+                                         remote_pth_to_file.as_posix())
 
-            self.shell.sync_to_remote(local_path=local_dir, remote_path=remote_dir)
+                    self.shell.sync_to_remote(local_path=local_dir, remote_path=remote_dir)
 
-            self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
-            self.assertEqual("hello", self.shell.read_text(remote_path=remote_pth_to_file))
+                    self.assertEqual(_HELLO_MD5, self.shell.md5(remote_path=remote_pth_to_file))
 
-    def test_files_differ_with_spaces(self):
+    def test_local_only_file(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
                 temppathlib.TemporaryDirectory() as local_tmpdir:
-            local_dir = local_tmpdir.path / "some dir"
-            local_pth_to_file = local_dir / "some file"
-            local_pth_to_file.parent.mkdir()
+            local_pth_to_file = local_tmpdir.path / "some-file"
             local_pth_to_file.write_text("hello")
 
-            remote_dir = remote_tmpdir.path / "some dir"
-            remote_pth_to_file = remote_dir / "some file"
-
-            self.shell.mkdir(remote_path=remote_dir)
-            self.shell.write_text(remote_path=remote_pth_to_file, text="zdravo")
-
-            self.shell.sync_to_remote(local_path=local_dir, remote_path=remote_dir)
+            self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
 
-            self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
-            self.assertEqual("hello", self.shell.read_text(remote_path=remote_pth_to_file))
+            remote_pth_to_file = remote_tmpdir.path / "some-file"
+            self.assertEqual(_HELLO_MD5, self.shell.md5(remote_path=remote_pth_to_file))
 
-    def test_local_only_file(self):
+    def test_bulk(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
                 temppathlib.TemporaryDirectory() as local_tmpdir:
-            local_pth_to_file = local_tmpdir.path / "some-file"
-            local_pth_to_file.write_text("hello")
+            for i in range(0, 16):
+                (local_tmpdir.path / "{}.txt".format(i)).write_text("hello")
 
-            self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
+            self.shell.sync_to_remote(
+                local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, consistent=False, bulk=True)
 
-            remote_pth_to_file = remote_tmpdir.path / "some-file"
-            self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
-            self.assertEqual("hello", self.shell.read_text(remote_path=remote_pth_to_file))
+            for i in range(0, 16):
+                self.assertEqual(_HELLO_MD5, self.shell.md5(remote_path=remote_tmpdir.path / "{}.txt".format(i)))
+
+    def test_bulk_requires_inconsistent_sync(self):  # pylint: disable=invalid-name
+        with temppathlib.TemporaryDirectory() as local_tmpdir:
+            with self.assertRaises(icontract.ViolationError):
+                self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path="/some-dir", bulk=True)
 
     @unittest.skipIf(platform.system() == "Windows", "Symbolic links admin privileges on Windows; "
                      "requesting admin privileges for unit testing is inappropriate.")
@@ -897,8 +946,7 @@ class TestSpurplusSyncToRemote(unittest.TestCase):
             # Check that the symlinks are copied as files, not as links
             remote_pth_to_link = remote_tmpdir.path / "some-link"
             self.assertFalse(self.shell.is_symlink(remote_path=remote_pth_to_link))
-            self.assertTrue(self.shell.exists(remote_path=remote_pth_to_link))
-            self.assertEqual("hello", self.shell.read_text(remote_path=remote_pth_to_link))
+            self.assertEqual(_HELLO_MD5, self.shell.md5(remote_path=remote_pth_to_link))
 
     def test_local_only_directory(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
@@ -913,73 +961,83 @@ class TestSpurplusSyncToRemote(unittest.TestCase):
             self.assertTrue(self.shell.is_dir(remote_path=remote_dir))
 
     def test_remote_only_file_is_deleted(self):  # pylint: disable=invalid-name
-        for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
-                    temppathlib.TemporaryDirectory() as local_tmpdir:
-                remote_pth_to_file = remote_tmpdir.path / "some-file"
-                self.shell.write_text(remote_path=remote_pth_to_file, text="hello")
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            remote_pth_to_file = remote_tmpdir.path / "some-file"
+
+            for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
+                with self.subTest(delete=delete):
+                    self.shell.write_text(remote_path=remote_pth_to_file, text="hello")
 
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
 
-                self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
+                    self.shell.sync_to_remote(
+                        local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
 
-                self.assertFalse(self.shell.exists(remote_path=remote_pth_to_file))
+                    self.assertFalse(self.shell.exists(remote_path=remote_pth_to_file))
 
     def test_remote_only_link_is_deleted(self):  # pylint: disable=invalid-name
-        for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
-                    temppathlib.TemporaryDirectory() as local_tmpdir:
-                remote_pth_to_file = remote_tmpdir.path / "some-file"
-                self.shell.write_text(remote_path=remote_pth_to_file, text="hello")
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            remote_pth_to_file = remote_tmpdir.path / "some-file"
+            self.shell.write_text(remote_path=remote_pth_to_file, text="hello")
+
+            remote_pth_to_link = remote_tmpdir.path / "some-link"
 
-                remote_pth_to_link = remote_tmpdir.path / "some-link"
-                self.shell.symlink(source=remote_pth_to_file, destination=remote_pth_to_link)
+            # Make a file in local so that only the link is deleted
+            (local_tmpdir.path / "some-file").write_text("hello")
 
-                # Make a file in local so that only the link is deleted
-                (local_tmpdir.path / "some-file").write_text("hello")
+            for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
+                with self.subTest(delete=delete):
+                    # Only the link is deleted by the sync so that only the link needs to be re-created.
+                    self.shell.symlink(source=remote_pth_to_file, destination=remote_pth_to_link)
 
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_link))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_link))
 
-                self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
+                    self.shell.sync_to_remote(
+                        local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
 
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
-                self.assertFalse(self.shell.exists(remote_path=remote_pth_to_link))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
+                    self.assertFalse(self.shell.exists(remote_path=remote_pth_to_link))
 
     def test_remote_only_dir_is_deleted(self):
-        for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
-                    temppathlib.TemporaryDirectory() as local_tmpdir:
-                remote_pth_to_dir = remote_tmpdir.path / "some-dir"
-                self.shell.mkdir(remote_path=remote_pth_to_dir)
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            remote_pth_to_dir = remote_tmpdir.path / "some-dir"
 
-                self.shell.write_text(remote_path=remote_pth_to_dir / "some-file", text="hello")
+            for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
+                with self.subTest(delete=delete):
+                    tests.common.arrange(self.shell, 'mkdir "$1" && printf hello > "$1/some-file"',
+                                         remote_pth_to_dir.as_posix())
 
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_dir))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_dir))
 
-                self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
+                    self.shell.sync_to_remote(
+                        local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
 
-                self.assertFalse(self.shell.exists(remote_path=remote_pth_to_dir))
+                    self.assertFalse(self.shell.exists(remote_path=remote_pth_to_dir))
 
     def test_remote_subdir_is_deleted(self):
-        for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
-            with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
-                    temppathlib.TemporaryDirectory() as local_tmpdir:
-                remote_pth_to_dir = remote_tmpdir.path / "some-dir"
-                self.shell.mkdir(remote_path=remote_pth_to_dir)
-                self.shell.write_text(remote_path=remote_pth_to_dir / "some-file", text="hello")
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            remote_pth_to_dir = remote_tmpdir.path / "some-dir"
+            remote_pth_to_subdir = remote_pth_to_dir / "some-subdir"
 
-                remote_pth_to_subdir = remote_tmpdir.path / "some-dir" / "some-subdir"
-                self.shell.mkdir(remote_path=remote_pth_to_subdir)
-                self.shell.write_text(remote_path=remote_pth_to_subdir / "some-file", text="hello")
+            for delete in [spurplus.Delete.BEFORE, spurplus.Delete.AFTER]:
+                with self.subTest(delete=delete):
+                    tests.common.arrange(
+                        self.shell, 'mkdir -p "$2" && printf hello > "$1/some-file" && printf hello > "$2/some-file"',
+                        remote_pth_to_dir.as_posix(), remote_pth_to_subdir.as_posix())
 
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_dir))
-                self.assertTrue(self.shell.exists(remote_path=remote_pth_to_subdir))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_dir))
+                    self.assertTrue(self.shell.exists(remote_path=remote_pth_to_subdir))
 
-                self.shell.sync_to_remote(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
+                    self.shell.sync_to_remote(
+                        local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, delete=delete)
 
-                self.assertFalse(self.shell.exists(remote_path=remote_pth_to_dir))
-                self.assertFalse(self.shell.exists(remote_path=remote_pth_to_subdir))
+                    self.assertFalse(self.shell.exists(remote_path=remote_pth_to_dir))
+                    self.assertFalse(self.shell.exists(remote_path=remote_pth_to_subdir))
 
     @unittest.skipIf(platform.system() == "Windows", "os.chmod is not properly implemented in Windows; "
                      "see https://stackoverflow.com/q/27500067")
@@ -1010,26 +1068,29 @@ class TestSpurplusSyncToRemote(unittest.TestCase):
             remote_new_dir = remote_tmpdir.path / "some-dir"
 
             remote_common_file = remote_tmpdir.path / "common-file"
-            self.shell.write_text(remote_path=remote_common_file, text="hello")
-            self.shell.chmod(remote_path=remote_common_file, mode=0o613)
-
             remote_different_file = remote_tmpdir.path / "different-file"
-            self.shell.write_text(remote_path=remote_different_file, text="hello")
-            self.shell.chmod(remote_path=remote_different_file, mode=0o614)
-
             remote_common_dir = remote_tmpdir.path / "common-dir"
-            self.shell.mkdir(remote_path=remote_common_dir, mode=0o715)
-            self.assertEqual(0o040715, self.shell.stat(remote_path=remote_common_dir).st_mode)
+
+            tests.common.arrange(self.shell,
+                                 'printf hello > "$1" && chmod 613 "$1" && printf hello > "$2" && chmod 614 "$2" && '
+                                 'mkdir -m 715 "$3"', remote_common_file.as_posix(), remote_different_file.as_posix(),
+                                 remote_common_dir.as_posix())
 
             # Execute
             self.shell.sync_to_remote(
                 local_path=local_tmpdir.path, remote_path=remote_tmpdir.path, preserve_permissions=True)
 
-            self.assertEqual(0o100601, self.shell.stat(remote_path=remote_new_file).st_mode)
-            self.assertEqual(0o040701, self.shell.stat(remote_path=remote_new_dir).st_mode)
-            self.assertEqual(0o100603, self.shell.stat(remote_path=remote_common_file).st_mode)
-            self.assertEqual(0o100604, self.shell.stat(remote_path=remote_different_file).st_mode)
-            self.assertEqual(0o040705, self.shell.stat(remote_path=remote_common_dir).st_mode)
+            # All the checked entries are in the same directory so that a single listing gives all their modes.
+            modes = {
+                attr.filename: attr.st_mode
+                for attr in self.shell.as_sftp().listdir_attr(remote_tmpdir.path.as_posix())
+            }
+
+            self.assertEqual(0o100601, modes[remote_new_file.name])
+            self.assertEqual(0o040701, modes[remote_new_dir.name])
+            self.assertEqual(0o100603, modes[remote_common_file.name])
+            self.assertEqual(0o100604, modes[remote_different_file.name])
+            self.assertEqual(0o040705, modes[remote_common_dir.name])
 
     def test_nonexisting_local_path(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
@@ -1063,78 +1124,121 @@ class TestSpurplusSyncToRemote(unittest.TestCase):
 
 class TestWhoami(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_that_it_works(self):
         params = tests.common.params_from_environ()
         self.assertEqual(params.username, self.shell.whoami())
 
 
-@unittest.skip("executed only on demand")
+def _best_duration(func: Callable[[], Any], rounds: int = 3) -> float:
+    """measures the shortest duration of the function over the rounds after a warm-up call."""
+    func()
+
+    durations = []  # type: List[float]
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return min(durations)
+
+
+@unittest.skipUnless(os.environ.get('SPURPLUS_BENCHMARK') == '1', "executed only on demand")
 class TestBenchmark(unittest.TestCase):
     def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-
-    def tearDown(self):
-        self.shell.close()
+        self.shell = tests.common.shared_test_shell()
 
     def test_that_reusing_sftp_is_faster_for_big_files(self):  # pylint: disable=invalid-name
         # Spurplus is slower at copying many small files than Spur due to the added safety overhead.
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            # open/close
             spur_shell = self.shell.as_spur()
 
-            start = time.time()
             number_of_files = 4
             size = 1024 * 1024 * 2
-            content = size * "hello"
+            content = (size * "hello").encode()
 
-            for i in range(0, number_of_files):
-                pth = tmpdir.path / '{}.txt'.format(i)
-                with spur_shell.open(name=pth.as_posix(), mode='wt') as fid:
-                    fid.write(content)
+            # prepare the paths outside of the measurements
+            base = tmpdir.path.as_posix()
+            pths = ['{}/{}.txt'.format(base, i) for i in range(0, number_of_files)]
 
-            their_duration = time.time() - start
+            # open/close
+            def write_with_spur() -> None:
+                for pth in pths:
+                    with spur_shell.open(name=pth, mode='wb') as fid:
+                        fid.write(content)
 
             # re-use sftp client
-            start = time.time()
-            for i in range(0, number_of_files):
-                pth = tmpdir.path / '{}.txt'.format(i)
-                self.shell.write_text(remote_path=pth, text=content, consistent=False, create_directories=False)
+            def write_with_spurplus() -> None:
+                for pth in pths:
+                    self.shell.write_bytes(remote_path=pth, data=content, consistent=False, create_directories=False)
+
+            their_duration = _best_duration(write_with_spur)
+            our_duration = _best_duration(write_with_spurplus)
 
-            our_duration = time.time() - start
             speedup = their_duration / our_duration
             self.assertGreater(speedup, 10.0)
 
+    def test_that_parallel_channels_are_faster_for_many_small_files(self):  # pylint: disable=invalid-name
+        # A single SFTP channel serializes the round trips of the small files whereas multiple channels overlap them.
+        number_of_channels = 8
+
+        with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
+            base = tmpdir.path.as_posix()
+            remote_pths = ["{}/{}.txt".format(base, i) for i in range(0, 128)]
+
+            def write_serially() -> None:
+                for pth in remote_pths:
+                    with self.shell.as_sftp().open(pth, 'wb') as fid:
+                        fid.write(b"hello")
+
+            transport = self.shell.as_spur()._get_ssh_transport()  # pylint: disable=protected-access
+            sftps = [paramiko.SFTPClient.from_transport(transport) for _ in range(number_of_channels)]
+
+            def write_slice(index: int) -> None:
+                for pth in remote_pths[index::number_of_channels]:
+                    with sftps[index].open(pth, 'wb') as fid:
+                        fid.write(b"hello")
+
+            def write_in_parallel() -> None:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=number_of_channels) as executor:
+                    list(executor.map(write_slice, range(number_of_channels)))
+
+            try:
+                serial_duration = _best_duration(write_serially)
+                parallel_duration = _best_duration(write_in_parallel)
+            finally:
+                for sftp in sftps:
+                    sftp.close()
+
+            speedup = serial_duration / parallel_duration
+            self.assertGreater(speedup, number_of_channels / 2)
+
     def test_md5_versus_md5s(self):
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            remote_pths = []  # type: List[pathlib.Path]
-            for i in range(0, 128):
-                pth = tmpdir.path / "{}.txt".format(i)
-                remote_pths.append(pth)
-
-                if i % 2 == 0:
-                    self.shell.write_text(remote_path=pth, text="hello")
-
-            start = time.time()
-            md5s = self.shell.md5s(remote_paths=remote_pths)
-            md5s_duration = time.time() - start
-
-            # now benchmark the manual implementation
-            start = time.time()
-            result = []  # type: List[Optional[str]]
-            for remote_pth in remote_pths:
-                if self.shell.exists(remote_path=remote_pth):
-                    result.append(self.shell.md5(remote_path=remote_pth))
-                else:
-                    result.append(None)
-
-            manual_duration = time.time() - start
-
-            self.assertListEqual(md5s, result)
+            base = tmpdir.path.as_posix()
+            remote_pths = ["{}/{}.txt".format(base, i) for i in range(0, 128)]  # type: List[str]
+
+            tests.common.write_files(self.shell, remote_pths[::2], b"hello")
+
+            # the manual implementation
+            def manual_md5s() -> List[Optional[str]]:
+                # list the directory once instead of checking the existence of each file
+                present = set(self.shell.as_sftp().listdir(base))
+
+                result = []  # type: List[Optional[str]]
+                for remote_pth in remote_pths:
+                    if posixpath.basename(remote_pth) in present:
+                        result.append(self.shell.md5(remote_path=remote_pth))
+                    else:
+                        result.append(None)
+
+                return result
+
+            self.assertListEqual(self.shell.md5s(remote_paths=remote_pths), manual_md5s())
+
+            md5s_duration = _best_duration(lambda: self.shell.md5s(remote_paths=remote_pths))
+            manual_duration = _best_duration(manual_md5s)
 
             speedup = manual_duration / md5s_duration
             self.assertGreaterEqual(speedup, 10.0)
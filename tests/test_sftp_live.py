@@ -14,6 +14,9 @@ import spurplus
 import spurplus.sftp
 import tests.common
 
+# creates three directories and a file beneath the directory given as the first argument
+_THREE_DIRS_AND_A_FILE_SCRIPT = 'mkdir "$1/some-dir1" "$1/some-dir2" "$1/some-dir3" && printf hello > "$1/some-file"'
+
 
 class TestConnectionFailure(unittest.TestCase):
     """
@@ -25,13 +28,25 @@ class TestConnectionFailure(unittest.TestCase):
     The connection should be automatically restarted and the call should be re-executed so that no exception is thrown.
     """
 
-    def setUp(self):
-        self.shell = tests.common.set_up_test_shell()
-        self.reconnecting_sftp = self.shell.as_sftp()
-        assert isinstance(self.reconnecting_sftp, spurplus.sftp.ReconnectingSFTP)
+    shell = None  # type: spurplus.SshShell
+    reconnecting_sftp = None  # type: spurplus.sftp.ReconnectingSFTP
+
+    @classmethod
+    def setUpClass(cls):
+        # The tests break only the SFTP channels, so a single SSH connection can be shared among them.
+        cls.shell = tests.common.set_up_test_shell()
+        cls.reconnecting_sftp = cls.shell.as_sftp()
+        assert isinstance(cls.reconnecting_sftp, spurplus.sftp.ReconnectingSFTP)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.shell.close()
 
-    def tearDown(self):
-        self.shell.close()
+    def break_connection(self) -> None:
+        """Close the underlying SFTP channel so that the next call needs to reconnect."""
+        sftp = self.reconnecting_sftp._sftp  # pylint: disable=protected-access
+        assert sftp is not None
+        sftp.sock.close()
 
     def test_files_differ(self) -> None:
         with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
@@ -46,10 +61,10 @@ class TestConnectionFailure(unittest.TestCase):
 
             self.shell.mkdir(remote_path=remote_dir)
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.shell.write_text(remote_path=remote_pth_to_file, text="zdravo")
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.shell.sync_to_remote(local_path=local_dir, remote_path=remote_dir)
 
             self.assertTrue(self.shell.exists(remote_path=remote_pth_to_file))
@@ -63,16 +78,16 @@ class TestConnectionFailure(unittest.TestCase):
             self.shell.mkdir(remote_path=remote_only_dir)
 
             # Diff
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             dir_diff = self.shell.directory_diff(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
 
             self.assertListEqual([pathlib.Path('remote-only-dir')], dir_diff.remote_only_directories)
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.shell.remove(remote_path=remote_only_dir, recursive=True)
 
             # Diff
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             dir_diff = self.shell.directory_diff(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
 
             self.assertListEqual([], dir_diff.remote_only_directories)
@@ -90,11 +105,11 @@ class TestConnectionFailure(unittest.TestCase):
 
             self.assertListEqual([pathlib.Path('file.txt')], dir_diff.local_only_files)
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.shell.put(local_path=local_pth, remote_path=remote_pth)
 
             # Diff
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             dir_diff = self.shell.directory_diff(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
 
             self.assertListEqual([pathlib.Path('file.txt')], dir_diff.identical_files)
@@ -111,28 +126,20 @@ class TestConnectionFailure(unittest.TestCase):
 
             self.assertListEqual([pathlib.Path('file.txt')], dir_diff.remote_only_files)
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.shell.get(local_path=local_pth, remote_path=remote_pth)
 
             # Diff
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             dir_diff = self.shell.directory_diff(local_path=local_tmpdir.path, remote_path=remote_tmpdir.path)
 
             self.assertListEqual([pathlib.Path('file.txt')], dir_diff.identical_files)
 
     def test_listdir_attr(self) -> None:
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            pth_to_dir1 = tmpdir.path / "some-dir1"
-            pth_to_dir2 = tmpdir.path / "some-dir2"
-            pth_to_dir3 = tmpdir.path / "some-dir3"
-            pth_to_file = tmpdir.path / "some-file"
+            tests.common.arrange(self.shell, _THREE_DIRS_AND_A_FILE_SCRIPT, tmpdir.path.as_posix())
 
-            self.shell.mkdir(remote_path=pth_to_dir1)
-            self.shell.mkdir(remote_path=pth_to_dir2)
-            self.shell.mkdir(remote_path=pth_to_dir3)
-            self.shell.write_text(remote_path=pth_to_file, text="hello")
-
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             listdir = self.reconnecting_sftp.listdir_attr(path=tmpdir.path.as_posix())
 
             self.assertEqual(4, len(listdir))
@@ -140,17 +147,9 @@ class TestConnectionFailure(unittest.TestCase):
 
     def test_listdir(self) -> None:
         with spurplus.TemporaryDirectory(shell=self.shell) as tmpdir:
-            pth_to_dir1 = tmpdir.path / "some-dir1"
-            pth_to_dir2 = tmpdir.path / "some-dir2"
-            pth_to_dir3 = tmpdir.path / "some-dir3"
-            pth_to_file = tmpdir.path / "some-file"
-
-            self.shell.mkdir(remote_path=pth_to_dir1)
-            self.shell.mkdir(remote_path=pth_to_dir2)
-            self.shell.mkdir(remote_path=pth_to_dir3)
-            self.shell.write_text(remote_path=pth_to_file, text="hello")
+            tests.common.arrange(self.shell, _THREE_DIRS_AND_A_FILE_SCRIPT, tmpdir.path.as_posix())
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             listdir = self.reconnecting_sftp.listdir(path=tmpdir.path.as_posix())
 
             self.assertEqual(4, len(listdir))
@@ -165,7 +164,7 @@ class TestConnectionFailure(unittest.TestCase):
             self.assertTrue(self.shell.exists(remote_path=pth_to_file))
             self.assertFalse(self.shell.exists(remote_path=new_pth_to_file))
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.reconnecting_sftp.posix_rename(oldpath=pth_to_file.as_posix(), newpath=new_pth_to_file.as_posix())
 
             self.assertFalse(self.shell.exists(remote_path=pth_to_file))
@@ -177,7 +176,7 @@ class TestConnectionFailure(unittest.TestCase):
 
             self.assertFalse(self.shell.exists(remote_path=pth_to_folder))
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.reconnecting_sftp.mkdir(path=pth_to_folder.as_posix())
 
             self.assertTrue(self.shell.exists(remote_path=pth_to_folder))
@@ -189,11 +188,33 @@ class TestConnectionFailure(unittest.TestCase):
 
             self.assertTrue(self.shell.exists(remote_path=pth_to_folder))
 
-            self.reconnecting_sftp._sftp.sock.close()  # pylint: disable=protected-access
+            self.break_connection()
             self.reconnecting_sftp.rmdir(path=pth_to_folder.as_posix())
 
             self.assertFalse(self.shell.exists(remote_path=pth_to_folder))
 
+    def test_put_many_and_get_many(self) -> None:
+        with spurplus.TemporaryDirectory(shell=self.shell) as remote_tmpdir, \
+                temppathlib.TemporaryDirectory() as local_tmpdir:
+            names = ['file{}.txt'.format(i) for i in range(20)]
+            for name in names:
+                (local_tmpdir.path / name).write_text(name)
+
+            self.reconnecting_sftp.put_many(pairs=[((local_tmpdir.path / name).as_posix(),
+                                                    (remote_tmpdir.path / name).as_posix()) for name in names])
+
+            for name in names:
+                self.assertEqual(name, self.shell.read_text(remote_path=remote_tmpdir.path / name))
+
+            download_dir = local_tmpdir.path / 'download'
+            download_dir.mkdir()
+
+            self.reconnecting_sftp.get_many(pairs=[((remote_tmpdir.path / name).as_posix(),
+                                                    (download_dir / name).as_posix()) for name in names])
+
+            for name in names:
+                self.assertEqual(name, (download_dir / name).read_text())
+
 
 class TestReconnectingSFTP(unittest.TestCase):
     def test_that_it_closes(self) -> None:
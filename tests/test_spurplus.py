@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 
-# pylint: disable=missing-docstring
+# pylint: disable=missing-docstring,protected-access
+import hashlib
+import io
 import pathlib  # pylint: disable=unused-import
+import posixpath
+import stat as stat_module
+import threading
+import time
 import unittest
-from typing import Optional  # pylint: disable=unused-import
+from typing import Any, Dict, List, Optional, Set  # pylint: disable=unused-import
+
+import paramiko
+import temppathlib
 
 import spurplus
+import spurplus._connection
+import spurplus._pipeline
 import spurplus.sftp
 
 
@@ -45,7 +56,7 @@ class TestChunkArguments(unittest.TestCase):
 class TestTemporaryFileContextManager(unittest.TestCase):
     def test_that_it_works(self) -> None:
         pth = None  # type: Optional[pathlib.Path]
-        with spurplus._temporary_file_deleted_after_cm_exit() as tmp:  # pylint: disable=protected-access
+        with spurplus._temporary_file_deleted_after_cm_exit() as tmp:
             pth = tmp.path
             self.assertTrue(pth.exists())
 
@@ -53,5 +64,601 @@ class TestTemporaryFileContextManager(unittest.TestCase):
         self.assertFalse(pth.exists())
 
 
+class _FakeTransport:
+    def __init__(self) -> None:
+        self.active = True
+
+    def is_active(self) -> bool:
+        return self.active
+
+
+class _FakeSock:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def get_transport(self) -> _FakeTransport:
+        return _FakeTransport()
+
+
+class _FakeSFTP:
+    """Simulate a paramiko SFTP client on an in-memory set of remote directories."""
+
+    def __init__(self, directories: Optional[Set[str]] = None) -> None:
+        self.sock = _FakeSock()
+        self.directories = {'/'} if directories is None else directories
+        self.calls = []  # type: List[str]
+        self.closed = False
+
+    def stat(self, path: str) -> paramiko.SFTPAttributes:
+        # The relative paths are resolved against the login directory /home.
+        self.calls.append('stat {}'.format(path))
+        if posixpath.join('/home', path) not in self.directories:
+            raise FileNotFoundError(path)
+
+        attr = paramiko.SFTPAttributes()
+        attr.st_mode = stat_module.S_IFDIR | 0o755
+        return attr
+
+    def listdir_attr(self, path: str) -> List[paramiko.SFTPAttributes]:
+        self.calls.append('listdir_attr {}'.format(path))
+
+        result = []  # type: List[paramiko.SFTPAttributes]
+        for directory in sorted(self.directories):
+            if directory != path and posixpath.dirname(directory) == path:
+                attr = paramiko.SFTPAttributes()
+                attr.filename = posixpath.basename(directory)
+                attr.st_mode = stat_module.S_IFDIR | 0o755
+                result.append(attr)
+
+        return result
+
+    def mkdir(self, path: str, mode: int = 0o777) -> None:  # pylint: disable=unused-argument
+        self.calls.append('mkdir {}'.format(path))
+        if path in self.directories:
+            raise OSError("Failure")
+
+        if posixpath.dirname(path) not in self.directories:
+            raise FileNotFoundError(path)
+
+        self.directories.add(path)
+
+    def posix_rename(self, oldpath: str, newpath: str) -> None:
+        self.calls.append('posix_rename {} {}'.format(oldpath, newpath))
+        if oldpath not in self.directories:
+            raise FileNotFoundError(oldpath)
+
+        self.directories.remove(oldpath)
+        self.directories.add(newpath)
+
+    def chmod(self, path: str, mode: int) -> None:  # pylint: disable=unused-argument
+        self.calls.append('chmod {}'.format(path))
+
+    def normalize(self, path: str) -> str:
+        self.calls.append('normalize {}'.format(path))
+        return posixpath.normpath(posixpath.join('/home', path))
+
+    def open(self, path: str, mode: str = 'r', _bufsize: int = -1) -> io.BytesIO:
+        self.calls.append('open {} {}'.format(path, mode))
+        directories = self.directories
+
+        class File(io.BytesIO):
+            def close(self) -> None:
+                # The file appears only once it is closed.
+                directories.add(path)
+                super().close()
+
+        return File()
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _caching_tuning() -> spurplus.sftp.Tuning:
+    tuning = spurplus.sftp.Tuning()
+    tuning.stat_ttl = 60.0
+    return tuning
+
+
+class TestReconnectingSFTPStatCache(unittest.TestCase):
+    def test_stat_is_cached(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.stat('/some-dir')
+        sftp.stat('/some-dir/')
+        self.assertListEqual(['stat /some-dir'], fake.calls)
+
+    def test_modification_invalidates(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.stat('/some-dir')
+        sftp.chmod('/some-dir', 0o700)
+        sftp.stat('/some-dir')
+        self.assertListEqual(['stat /some-dir', 'chmod /some-dir', 'stat /some-dir'], fake.calls)
+
+    def test_missing_path_is_cached(self) -> None:
+        fake = _FakeSFTP(directories={'/'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        for _ in range(2):
+            with self.assertRaises(FileNotFoundError):
+                sftp.stat('/some-dir')
+
+        sftp.mkdir('/some-dir')
+        sftp.stat('/some-dir')
+        self.assertListEqual(['stat /some-dir', 'mkdir /some-dir', 'stat /some-dir'], fake.calls)
+
+    def test_stat_uses_the_listing(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.listdir_attr('/')
+        sftp.stat('/some-dir')
+        with self.assertRaises(FileNotFoundError):
+            sftp.stat('/another-dir')
+
+        self.assertListEqual(['listdir_attr /'], fake.calls)
+
+        sftp.mkdir('/another-dir')
+        sftp.stat('/another-dir')
+        self.assertListEqual(['listdir_attr /', 'mkdir /another-dir', 'stat /another-dir'], fake.calls)
+
+    def test_stats_are_cached(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        for _ in range(2):
+            attributes = sftp.stats(paths=['/some-dir', '/another-dir'])
+            self.assertIsNotNone(attributes[0])
+            self.assertIsNone(attributes[1])
+
+        self.assertListEqual(['stat /some-dir', 'stat /another-dir'], fake.calls)
+
+    def test_renames_invalidate(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.stats(paths=['/some-dir', '/another-dir'])
+
+        errors = sftp.posix_renames(pairs=[('/some-dir', '/another-dir'), ('/missing-dir', '/yet-another-dir')])
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], FileNotFoundError)
+
+        attributes = sftp.stats(paths=['/some-dir', '/another-dir'])
+        self.assertIsNone(attributes[0])
+        self.assertIsNotNone(attributes[1])
+
+        self.assertListEqual([
+            'stat /some-dir', 'stat /another-dir', 'posix_rename /some-dir /another-dir',
+            'posix_rename /missing-dir /yet-another-dir', 'stat /some-dir', 'stat /another-dir'
+        ], fake.calls)
+
+    def test_lstat_shares_the_cache(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        fake.lstat = fake.stat  # type: ignore  # pylint: disable=attribute-defined-outside-init
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.lstat('/some-dir')
+        sftp.stat('/some-dir')
+        self.assertListEqual(['stat /some-dir'], fake.calls)
+
+        sftp.listdir_attr('/')
+        sftp.lstat('/some-dir')
+        with self.assertRaises(FileNotFoundError):
+            sftp.lstat('/another-dir')
+
+        self.assertListEqual(['stat /some-dir', 'listdir_attr /'], fake.calls)
+
+    def test_relative_path_shares_the_key(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/home', '/home/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.stat('some-dir')
+        sftp.stat('/home/some-dir')
+        sftp.chmod('/home/some-dir', 0o700)
+        sftp.stat('some-dir')
+        self.assertListEqual(['normalize .', 'stat some-dir', 'chmod /home/some-dir', 'stat some-dir'], fake.calls)
+
+    def test_written_file_is_invalidated_on_close(self) -> None:
+        fake = _FakeSFTP(directories={'/'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        with sftp.open('/some-file', 'wb'):
+            with self.assertRaises(FileNotFoundError):
+                sftp.stat('/some-file')
+
+        sftp.stat('/some-file')
+        self.assertListEqual(['open /some-file wb', 'stat /some-file', 'stat /some-file'], fake.calls)
+
+    def test_is_known_directory(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        self.assertFalse(sftp.is_known_directory(path='/some-dir'))
+
+        sftp.stat('/some-dir')
+        self.assertTrue(sftp.is_known_directory(path='/some-dir'))
+        self.assertListEqual(['stat /some-dir'], fake.calls)
+
+    def test_cache_is_disabled_by_default(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/some-dir'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake)
+
+        sftp.stat('/some-dir')
+        sftp.stat('/some-dir')
+        self.assertListEqual(['stat /some-dir', 'stat /some-dir'], fake.calls)
+
+
+class _FakeGetSFTP:
+    """Count the downloads and report the progress with the given callback."""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def get(self, remotepath: str, localpath: str, callback: Any = None, **kwargs) -> None:
+        # pylint: disable=unused-argument
+        self.count += 1
+        callback(0, 1)
+
+
+class TestPipelineGet(unittest.TestCase):
+    def test_callback_error_is_not_retried(self) -> None:
+        def callback(transferred: int, total: int) -> None:
+            raise TypeError("Some error in the callback: {} {}".format(transferred, total))
+
+        fake = _FakeGetSFTP()
+        with self.assertRaises(TypeError):
+            spurplus._pipeline.get(sftp=fake, remotepath='/some-file', localpath='/tmp/some-file', callback=callback)
+
+        self.assertEqual(1, fake.count)
+
+
+class _FailingOpener:
+    """Count the attempts to open an SFTP client which all fail with the given error."""
+
+    def __init__(self, error: Exception) -> None:
+        self.error = error
+        self.count = 0
+
+    def __call__(self) -> paramiko.SFTP:
+        self.count += 1
+        raise self.error
+
+
+class TestReconnectingSFTPRetries(unittest.TestCase):
+    def test_connection_failure_is_retried(self) -> None:
+        error = EOFError()
+        opener = _FailingOpener(error=error)
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=opener, max_retries=3, retry_period=0.0)
+
+        with self.assertRaises(ConnectionError) as context:
+            sftp.stat('/some-dir')
+
+        self.assertEqual(3, opener.count)
+        self.assertIs(error, context.exception.__cause__)
+
+    def test_no_wait_after_the_last_attempt(self) -> None:
+        opener = _FailingOpener(error=EOFError())
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=opener, max_retries=1, retry_period=60.0)
+
+        start = time.monotonic()
+        with self.assertRaises(ConnectionError):
+            sftp.stat('/some-dir')
+
+        self.assertLess(time.monotonic() - start, 30.0)
+
+    def test_authentication_failure_is_not_retried(self) -> None:
+        for error in [paramiko.AuthenticationException(), paramiko.BadHostKeyException('some-host', None, None)]:
+            opener = _FailingOpener(error=error)
+            sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=opener, max_retries=3, retry_period=0.0)
+
+            with self.assertRaises(type(error)):
+                sftp.stat('/some-dir')
+
+            self.assertEqual(1, opener.count)
+
+
+class _CountingOpener:
+    """Open a new fake SFTP client on each call."""
+
+    def __init__(self) -> None:
+        self.opened = []  # type: List[_FakeSFTP]
+        self.lock = threading.Lock()
+
+    def __call__(self) -> _FakeSFTP:
+        fake = _FakeSFTP()
+        with self.lock:
+            self.opened.append(fake)
+        return fake
+
+
+def _pool_tuning() -> spurplus.sftp.Tuning:
+    tuning = spurplus.sftp.Tuning()
+    tuning.pool_size = 2
+    return tuning
+
+
+class TestReconnectingSFTPPool(unittest.TestCase):
+    def test_no_connection_is_used_concurrently(self) -> None:
+        opener = _CountingOpener()
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=opener, tuning=_pool_tuning())
+
+        in_use = dict()  # type: Dict[int, threading.Lock]
+        overlaps = []  # type: List[int]
+
+        def use(fake: _FakeSFTP) -> None:
+            lock = in_use.setdefault(id(fake), threading.Lock())
+            if not lock.acquire(blocking=False):
+                overlaps.append(id(fake))
+                return
+
+            try:
+                time.sleep(0.001)
+            finally:
+                lock.release()
+
+        def work() -> None:
+            for _ in range(10):
+                sftp.call(use)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertListEqual([], overlaps)
+        self.assertLessEqual(len(opener.opened), 2)
+
+    def test_dead_connection_is_reopened(self) -> None:
+        opener = _CountingOpener()
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=opener, retry_period=0.0, tuning=_pool_tuning())
+
+        def use(fake: _FakeSFTP) -> None:
+            if fake.sock.closed:
+                raise EOFError()
+
+        sftp.call(use)
+        self.assertEqual(1, len(opener.opened))
+
+        opener.opened[0].sock.closed = True
+        sftp.call(use)
+
+        self.assertEqual(2, len(opener.opened))
+        self.assertTrue(opener.opened[0].closed)
+        self.assertFalse(opener.opened[1].closed)
+
+
+class _FakeClient:
+    def __init__(self) -> None:
+        self.transport = _FakeTransport()
+        self.closed = False
+
+    def get_transport(self) -> _FakeTransport:
+        return self.transport
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def _connection_key(hostname: str, password: Optional[str] = None,
+                    missing_host_key: Any = None) -> spurplus._connection.ConnectionKey:
+    return spurplus._connection.ConnectionKey(
+        hostname=hostname,
+        port=22,
+        username='some-user',
+        password_digest=spurplus._connection.digest_password(password=password),
+        private_key_file=None,
+        look_for_private_keys=True,
+        load_system_host_keys=True,
+        missing_host_key=missing_host_key,
+        compress=False)
+
+
+class TestSharedClient(unittest.TestCase):
+    def test_password_is_not_kept(self) -> None:
+        key = _connection_key(hostname='test-password-is-not-kept', password='some-password')
+
+        self.assertNotIn('some-password', repr(key))
+        self.assertEqual(key, _connection_key(hostname='test-password-is-not-kept', password='some-password'))
+
+    def test_reuse_and_close(self) -> None:
+        key = _connection_key(hostname='test-reuse-and-close')
+        client = _FakeClient()
+        shared = spurplus._connection.SharedClient(client=client)
+        shared.register(key=key)
+
+        self.assertIs(shared, spurplus._connection.SharedClient.acquire(key=key))
+        self.assertEqual(2, shared.users)
+
+        shared.release()
+        self.assertFalse(client.closed)
+
+        shared.release()
+        self.assertTrue(client.closed)
+        self.assertIsNone(spurplus._connection.SharedClient.acquire(key=key))
+
+    def test_other_credentials_and_policy_are_not_shared(self) -> None:
+        key = _connection_key(hostname='test-other-credentials', password='some-password', missing_host_key='accept')
+        shared = spurplus._connection.SharedClient(client=_FakeClient())
+        shared.register(key=key)
+
+        try:
+            another_key = _connection_key(
+                hostname='test-other-credentials', password='another-password', missing_host_key='accept')
+            self.assertIsNone(spurplus._connection.SharedClient.acquire(key=another_key))
+            self.assertIsNone(spurplus._connection.SharedClient.acquire(key=key._replace(missing_host_key='raise')))
+            self.assertIsNone(spurplus._connection.SharedClient.acquire(key=key._replace(private_key_file='/some/key')))
+            self.assertEqual(1, shared.users)
+        finally:
+            shared.release()
+
+    def test_dead_connection_is_not_shared(self) -> None:
+        key = _connection_key(hostname='test-dead-connection')
+        client = _FakeClient()
+        shared = spurplus._connection.SharedClient(client=client)
+        shared.register(key=key)
+
+        client.transport.active = False
+        self.assertIsNone(spurplus._connection.SharedClient.acquire(key=key))
+
+        # A new client can take the place of the dead one.
+        another_shared = spurplus._connection.SharedClient(client=_FakeClient())
+        another_shared.register(key=key)
+        self.assertIs(another_shared, spurplus._connection.SharedClient.acquire(key=key))
+
+        for _ in range(2):
+            another_shared.release()
+        shared.release()
+
+        self.assertTrue(client.closed)
+        self.assertIsNone(spurplus._connection.SharedClient.acquire(key=key))
+
+
+class TestMkdir(unittest.TestCase):
+    def test_existing_directory(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a', '/a/b'})
+
+        spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b', parents=True, exist_ok=True)
+        self.assertListEqual(['mkdir /a', 'mkdir /a/b', 'stat /a/b'], fake.calls)
+
+    def test_missing_parents_are_created(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a'})
+
+        spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b/c', parents=True, exist_ok=True)
+        self.assertSetEqual({'/', '/a', '/a/b', '/a/b/c'}, fake.directories)
+        self.assertListEqual(['mkdir /a', 'mkdir /a/b', 'mkdir /a/b/c'], fake.calls)
+
+    def test_known_directory_costs_no_call(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a', '/a/b'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake, tuning=_caching_tuning())
+
+        sftp.listdir_attr('/a')
+        spurplus.sftp._mkdir(sftp=sftp, remote_path='/a/b', parents=True, exist_ok=True)
+        self.assertListEqual(['listdir_attr /a'], fake.calls)
+
+    def test_existing_directory_without_exist_ok(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a', '/a/b'})
+
+        with self.assertRaises(FileExistsError):
+            spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b', parents=True)
+
+        self.assertListEqual(['mkdir /a', 'mkdir /a/b', 'stat /a/b'], fake.calls)
+
+    def test_without_parents(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a'})
+
+        spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b')
+        self.assertListEqual(['mkdir /a/b'], fake.calls)
+
+        with self.assertRaises(FileExistsError):
+            spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b')
+
+        spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b', exist_ok=True)
+
+    def test_missing_parent_without_parents(self) -> None:
+        fake = _FakeSFTP(directories={'/'})
+
+        with self.assertRaises(FileNotFoundError):
+            spurplus.sftp._mkdir(sftp=fake, remote_path='/a/b', parents=False)
+
+
+class TestStatBatch(unittest.TestCase):
+    def test_siblings_are_listed_once(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a', '/a/b', '/a/c'})
+
+        self.assertListEqual([True, True, False],
+                             spurplus.sftp._exists_many(sftp=fake, remote_paths=['/a/b', '/a/c', '/a/d']))
+        self.assertListEqual(['listdir_attr /a'], fake.calls)
+
+    def test_missing_parent(self) -> None:
+        fake = _FakeSFTP(directories={'/'})
+        fake_listdir_attr = fake.listdir_attr
+
+        def listdir_attr(path: str) -> List[paramiko.SFTPAttributes]:
+            if path not in fake.directories:
+                raise FileNotFoundError(path)
+            return fake_listdir_attr(path)
+
+        fake.listdir_attr = listdir_attr  # type: ignore
+
+        self.assertListEqual([False, False], spurplus.sftp._exists_many(sftp=fake, remote_paths=['/a/b', '/a/c']))
+
+
+class TestWalk(unittest.TestCase):
+    def test_relative_paths(self) -> None:
+        fake = _FakeSFTP(directories={'/', '/a', '/a/b', '/a/b/c', '/a/d'})
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: fake)
+
+        rel_pths = sorted(rel_pth for rel_pth, _ in spurplus.sftp._walk(sftp=sftp, remote_path='/a'))
+        self.assertListEqual(['b', 'b/c', 'd'], rel_pths)
+
+
+class TestMD5Command(unittest.TestCase):
+    def test_dash(self) -> None:
+        command = spurplus._md5_command(remote_paths=['/some/file', '-some-file', './-another-file'])
+        self.assertListEqual(['/some/file', './-some-file', './-another-file'], command[4:])
+
+    def test_parse(self) -> None:
+        hsh = 'd41d8cd98f00b204e9800998ecf8427e'
+
+        # md5sum
+        self.assertTupleEqual((hsh, '/some file'), spurplus._parse_md5_line(line=hsh + '  /some file'))
+
+        # openssl dgst -r
+        self.assertTupleEqual((hsh, '/some file'), spurplus._parse_md5_line(line=hsh + ' */some file'))
+        self.assertTupleEqual((hsh, './-some-file'), spurplus._parse_md5_line(line=hsh + ' *./-some-file'))
+
+        # escaped paths
+        self.assertTupleEqual(
+            (hsh, '/some\\file\nwith breaks\r'),
+            spurplus._parse_md5_line(line='\\' + hsh + '  /some\\\\file\\nwith breaks\\r'))
+        self.assertTupleEqual((hsh, '/some\\nfile'), spurplus._parse_md5_line(line='\\' + hsh + ' */some\\\\nfile'))
+
+
+class TestLocalMD5(unittest.TestCase):
+    def test_large_file(self) -> None:
+        with temppathlib.NamedTemporaryFile() as tmp:
+            data = b'hello' * (1024 * 1024)
+            tmp.path.write_bytes(data)
+
+            self.assertEqual(hashlib.md5(data).hexdigest(), spurplus._local_md5(path=tmp.path))
+
+
+class _FakeFile(io.BytesIO):
+    def prefetch(self) -> None:
+        pass
+
+
+class _FakeFileSFTP:
+    def __init__(self, files: Dict[str, bytes]) -> None:
+        self.files = files
+
+    def open(self, path: str, mode: str = 'r') -> _FakeFile:  # pylint: disable=unused-argument
+        if path not in self.files:
+            raise FileNotFoundError(path)
+
+        return _FakeFile(self.files[path])
+
+
+class TestMD5OverSFTP(unittest.TestCase):
+    def test_existing_file(self) -> None:
+        sftp = _FakeFileSFTP(files={'/some-file': b'hello'})
+        self.assertEqual(
+            hashlib.md5(b'hello').hexdigest(), spurplus._md5_over_sftp(sftp=sftp, remote_path='/some-file'))
+
+    def test_missing_file(self) -> None:
+        sftp = _FakeFileSFTP(files=dict())
+        self.assertIsNone(spurplus._md5_over_sftp(sftp=sftp, remote_path='/some-file'))
+
+    def test_pooled_connections(self) -> None:
+        files = {'/some-file': b'hello', '/another-file': b'world'}
+        sftp = spurplus.sftp.ReconnectingSFTP(sftp_opener=lambda: _FakeFileSFTP(files=files), tuning=_pool_tuning())
+
+        hshs = spurplus._md5s_over_sftp(sftp=sftp, remote_paths=['/some-file', '/missing-file', '/another-file'])
+        self.assertListEqual([hashlib.md5(b'hello').hexdigest(), None, hashlib.md5(b'world').hexdigest()], hshs)
+
+
 if __name__ == '__main__':
     unittest.main()